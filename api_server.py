@@ -0,0 +1,412 @@
+import asyncio
+import json
+import threading
+from pathlib import Path
+from urllib.parse import urlsplit, parse_qs
+from batch_fetcher import BatchFetcher, SourceStatus
+from request_scheduler import RequestScheduler
+from format_planner import projected_bytes
+from library_catalog import LibraryCatalog, ORDERS
+from task_log import app_log, LEVELS
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+REASONS = {
+    200: 'OK',
+    202: 'Accepted',
+    400: 'Bad Request',
+    401: 'Unauthorized',
+    403: 'Forbidden',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    413: 'Payload Too Large',
+    415: 'Unsupported Media Type',
+    500: 'Internal Server Error'
+}
+
+MAX_BODY = 1024 * 1024
+
+class ControlServer:
+    """Local HTTP/JSON API over a DownloadManager
+    
+    Reads are served from a snapshot that one background coroutine refreshes
+    when the manager's revision changes, so polling clients never contend
+    for the manager's lock. Progress is streamed as server-sent events.
+    """
+    
+    def __init__(self, config, download_manager, host=None, port=None):
+        self.config = config
+        self.download_manager = download_manager
+        self.host = host or config.get('api_host')
+        self.port = port or config.get('api_port')
+        self.token = config.get('api_token')
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self.error = None
+        self.queue_lock = threading.Lock()
+        self.subscribers = set()
+        self.revision = -1
+        self.stats_body = b'{}'
+        self.tasks_body = b'[]'
+        self.tasks = {}
+        self.stats = {}
+    
+    def start(self):
+        """Run the server on a background thread; raises OSError if it can't listen"""
+        ready = threading.Event()
+        self.error = None
+        self.thread = threading.Thread(target=self._run_loop, args=(ready,), name='api', daemon=True)
+        self.thread.start()
+        ready.wait(timeout=5)
+        if self.error:
+            self.thread.join(timeout=5)
+            raise self.error
+    
+    def stop(self):
+        if self.loop and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        if self.thread:
+            self.thread.join(timeout=5)
+    
+    def _run_loop(self, ready):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            try:
+                self.loop.run_until_complete(self._open())
+            except OSError as e:
+                # Port in use, bad host...: reported by start()
+                self.error = e
+                return
+            ready.set()
+            self.loop.run_forever()
+        finally:
+            ready.set()
+            if self.server:
+                self.server.close()
+            pending = asyncio.all_tasks(self.loop)
+            for task in pending:
+                task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self.loop.close()
+    
+    async def _open(self):
+        self.loop = asyncio.get_running_loop()
+        self.server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.loop.create_task(self._refresh_loop())
+    
+    # ===== SNAPSHOT =====
+    
+    async def _refresh_loop(self):
+        interval = self.config.get('api_refresh_interval')
+        while True:
+            if self.download_manager.revision != self.revision:
+                self._refresh()
+            await asyncio.sleep(interval)
+    
+    def _refresh(self):
+        revision, stats, tasks = self.download_manager.snapshot()
+        
+        # Only tasks whose fields changed since the last refresh are pushed
+        # to event-stream clients; many progress ticks collapse into one event
+        current = {t['id']: t for t in tasks}
+        changed = [t for t in tasks if self.tasks.get(t['id']) != t]
+        removed = [task_id for task_id in self.tasks if task_id not in current]
+        
+        self.revision = revision
+        self.tasks = current
+        self.stats = stats
+        self.stats_body = json.dumps(stats).encode()
+        self.tasks_body = json.dumps(tasks).encode()
+        
+        if changed or removed:
+            event = self._sse('progress', {'stats': stats, 'tasks': changed, 'removed': removed})
+            for subscriber in list(self.subscribers):
+                try:
+                    subscriber.put_nowait(event)
+                except asyncio.QueueFull:
+                    # Slow client: disconnect it rather than buffer without
+                    # limit; it resyncs from the snapshot when it reconnects
+                    while not subscriber.empty():
+                        subscriber.get_nowait()
+                    subscriber.put_nowait(None)
+                    self.subscribers.discard(subscriber)
+    
+    @staticmethod
+    def _sse(event, data):
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+    
+    # ===== HTTP =====
+    
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, query, headers, body = request
+                
+                if path == '/api/events' and method == 'GET':
+                    try:
+                        self._check_access(headers)
+                    except HTTPError as e:
+                        status, payload = e.status, {'error': e.message}
+                    else:
+                        await self._stream_events(writer)
+                        break
+                else:
+                    try:
+                        status, payload = await self._dispatch(method, path, query, headers, body)
+                    except HTTPError as e:
+                        status, payload = e.status, {'error': e.message}
+                    except Exception as e:
+                        status, payload = 500, {'error': str(e)}
+                
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                await self._write_response(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        except HTTPError as e:
+            await self._write_response(writer, e.status, {'error': e.message}, False)
+        finally:
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except (Exception, asyncio.CancelledError):
+                pass
+    
+    async def _read_request(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        
+        try:
+            method, target, _ = line.decode('latin-1').split(' ', 2)
+        except ValueError:
+            raise HTTPError(400, 'Malformed request line')
+        
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            raise HTTPError(400, 'Invalid Content-Length')
+        if length > MAX_BODY:
+            raise HTTPError(413, 'Request body too large')
+        body = await reader.readexactly(length) if length else b''
+        
+        url = urlsplit(target)
+        return method.upper(), url.path.rstrip('/') or '/', parse_qs(url.query), headers, body
+    
+    async def _write_response(self, writer, status, payload, keep_alive):
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        head = (
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode() + body)
+        await writer.drain()
+    
+    async def _stream_events(self, writer):
+        subscriber = asyncio.Queue(maxsize=100)
+        self.subscribers.add(subscriber)
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Cache-Control: no-cache\r\n"
+            b"Connection: close\r\n\r\n"
+        )
+        writer.write(self._sse('snapshot', {'stats': self.stats, 'tasks': list(self.tasks.values())}))
+        await writer.drain()
+        
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    event = b": keep-alive\n\n"
+                if event is None:
+                    break
+                writer.write(event)
+                await writer.drain()
+        finally:
+            self.subscribers.discard(subscriber)
+    
+    def _check_access(self, headers):
+        if self.token:
+            if headers.get('authorization') != f"Bearer {self.token}":
+                raise HTTPError(401, 'Missing or invalid token')
+            return
+        # Without a token, a DNS-rebinding page would count as same-origin;
+        # its requests still carry the attacker's host name, so refuse them
+        host = urlsplit('//' + headers.get('host', '')).hostname
+        if host not in ('127.0.0.1', 'localhost', '::1', self.host):
+            raise HTTPError(403, 'Unexpected Host header; set api_token to allow other host names')
+    
+    # ===== ROUTES =====
+    
+    async def _dispatch(self, method, path, query, headers, body):
+        self._check_access(headers)
+        
+        if path == '/api/stats':
+            self._require(method, 'GET')
+            return 200, self.stats_body
+        
+        if path == '/api/requests':
+            self._require(method, 'GET')
+            return 200, RequestScheduler.shared(self.config).report()
+        
+        if path == '/api/library':
+            self._require(method, 'GET')
+            return 200, await self._blocking(self._search_library, query)
+        
+        if path == '/api/tasks':
+            self._require(method, 'GET')
+            statuses = {s.lower() for s in query.get('status', [])}
+            if not statuses:
+                return 200, self.tasks_body
+            return 200, [t for t in self.tasks.values() if t['status'].lower() in statuses]
+        
+        if path == '/api/videos':
+            self._require(method, 'POST')
+            return await self._add_videos(self._json(headers, body))
+        
+        if path == '/api/concurrency':
+            self._require(method, 'POST')
+            count = self._json(headers, body).get('max_concurrent')
+            # bool is an int subclass; 'true' must not become one worker
+            if not isinstance(count, int) or isinstance(count, bool) or count < 1:
+                raise HTTPError(400, "'max_concurrent' must be a positive integer")
+            count = min(count, self.config.get('max_concurrent_limit'))
+            await self._blocking(self.download_manager.set_max_concurrent, count)
+            return 200, {'max_concurrent': count}
+        
+        if path == '/api/log':
+            self._require(method, 'GET')
+            return 200, await self._blocking(app_log.entries, self._log_level(query))
+        
+        parts = path.strip('/').split('/')
+        if len(parts) == 4 and parts[:2] == ['api', 'tasks'] and parts[3] in ('cancel', 'log'):
+            self._require(method, 'POST' if parts[3] == 'cancel' else 'GET')
+            try:
+                task_id = int(parts[2])
+            except ValueError:
+                raise HTTPError(404, 'Unknown task')
+            task = await self._blocking(self.download_manager.get_task, task_id)
+            if task is None:
+                raise HTTPError(404, 'Unknown task')
+            if parts[3] == 'log':
+                return 200, await self._blocking(task.log.entries, self._log_level(query))
+            await self._blocking(self.download_manager.cancel_task, task)
+            return 200, {'id': task_id, 'status': task.status}
+        
+        raise HTTPError(404, 'Not found')
+    
+    @staticmethod
+    async def _blocking(fn, *args):
+        # SQLite and manager-lock work must not stall every other client
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+    
+    @staticmethod
+    def _log_level(query):
+        level = query.get('level', ['debug'])[0]
+        if level not in LEVELS:
+            raise HTTPError(400, f"'level' must be one of: {', '.join(LEVELS)}")
+        return level
+    
+    def _search_library(self, query):
+        order = query.get('order', ['newest'])[0]
+        if order not in ORDERS:
+            raise HTTPError(400, f"'order' must be one of: {', '.join(ORDERS)}")
+        max_limit = self.config.get('library_search_limit')
+        try:
+            limit = int(query.get('limit', [max_limit])[0])
+        except ValueError:
+            raise HTTPError(400, "'limit' must be an integer")
+        # SQLite reads a negative LIMIT as "no limit"
+        limit = max(1, min(limit, max_limit))
+        return LibraryCatalog.shared(self.config).query(query.get('q', [''])[0], order, limit)
+    
+    async def _add_videos(self, data):
+        output_path = data.get('output_path') or self.config.get('download_path')
+        videos = data.get('videos')
+        urls = data.get('urls')
+        
+        if videos:
+            if not all(isinstance(v, dict) and v.get('id') and v.get('url') for v in videos):
+                raise HTTPError(400, "Each video needs an 'id' and 'url'")
+            queued = await self._blocking(self._queue_videos, videos, output_path)
+            return 202, {'queued': len(queued), 'skipped': len(videos) - len(queued),
+                         'projected_bytes': projected_bytes(queued)['bytes']}
+        
+        if not urls or not isinstance(urls, list):
+            raise HTTPError(400, "Expected 'urls' or 'videos' list")
+        if not all(isinstance(url, str) and url.strip() for url in urls):
+            raise HTTPError(400, "Each entry in 'urls' must be a non-empty string")
+        
+        # Enumeration can take minutes for big channels; accept now and let
+        # the fetch pool queue the results when it finishes
+        def fetch_and_queue():
+            try:
+                fetcher = BatchFetcher(self.config)
+                found = fetcher.fetch(urls, self.download_manager.known_video_ids())
+                for source in fetcher.sources:
+                    if source.status == SourceStatus.FAILED:
+                        app_log.error(f"API fetch failed: {source.error}", url=source.url)
+                if found:
+                    self._queue_videos(found, output_path)
+            except Exception as e:
+                app_log.error(f"API fetch error: {e}", urls=len(urls))
+        
+        threading.Thread(target=fetch_and_queue, name='api-fetch', daemon=True).start()
+        return 202, {'sources': len(urls)}
+    
+    def _queue_videos(self, videos, output_path):
+        """Queue the videos that aren't queued or downloaded yet; returns those"""
+        # A second task for the same video would share its staging folder
+        with self.queue_lock:
+            known = self.download_manager.known_video_ids()
+            new = []
+            for video in videos:
+                if video['id'] not in known:
+                    known.add(video['id'])
+                    new.append(video)
+            if new:
+                Path(output_path).mkdir(parents=True, exist_ok=True)
+                self.download_manager.add_videos(new, output_path)
+        return new
+    
+    @staticmethod
+    def _require(method, expected):
+        if method != expected:
+            raise HTTPError(405, f"Use {expected}")
+    
+    @staticmethod
+    def _json(headers, body):
+        # Requiring a JSON content type also keeps browsers from posting to
+        # the API cross-site without a CORS preflight, which is never granted
+        # (DNS rebinding gets around that; _check_access covers it)
+        if not headers.get('content-type', '').startswith('application/json'):
+            raise HTTPError(415, 'Content-Type must be application/json')
+        try:
+            data = json.loads(body or b'{}')
+        except ValueError:
+            raise HTTPError(400, 'Invalid JSON body')
+        if not isinstance(data, dict):
+            raise HTTPError(400, 'Expected a JSON object')
+        return data
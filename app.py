@@ -4,6 +4,120 @@ YouTube Downloader Pro
 A modern, production-ready YouTube video downloader
 """
 
+import argparse
+import sys
+
+def headless_main(args):
+    """Headless mode: watch subscribed channels and/or serve the control API"""
+    import time
+    from config import Config
+    from download_manager import DownloadManager
+    
+    config = Config()
+    if args.profile:
+        config.settings['profile_batches'] = True
+    
+    if args.subscribe:
+        config.add_subscription(args.subscribe, args.interval, False if args.no_backfill else None)
+        print(f"Subscribed: {args.subscribe}")
+        return
+    if args.unsubscribe:
+        config.remove_subscription(args.unsubscribe)
+        print(f"Unsubscribed: {args.unsubscribe}")
+        return
+    if args.list:
+        for sub in config.get('subscriptions'):
+            interval = sub.get('interval') or config.get('watch_interval')
+            print(f"{sub['url']}  (every {interval}s)")
+        return
+    
+    queue_path = args.queue or config.get('job_queue_path')
+    if args.worker:
+        if not queue_path:
+            print("--worker needs --queue PATH (or 'job_queue_path' in the config)")
+            return
+        from distributed import WorkerManager, open_job_queue
+        download_manager = WorkerManager(config, open_job_queue(config, queue_path))
+        print(f"Worker {download_manager.worker_id} draining {queue_path}")
+        download_manager.start()
+    elif queue_path:
+        from distributed import CoordinatorManager, open_job_queue
+        download_manager = CoordinatorManager(config, open_job_queue(config, queue_path))
+    else:
+        download_manager = DownloadManager(config)
+    download_manager.set_callback('download_complete',
+                                  lambda task: print(f"{task.status}: {task.video_info.get('title')}"))
+    if not queue_path:
+        resumed = download_manager.resume_session()
+        if resumed:
+            print(f"Resuming {resumed} unfinished download(s) from the last session.")
+    
+    watcher = None
+    if args.watch:
+        from watcher import ChannelWatcher
+        watcher = ChannelWatcher(config, download_manager, args.output)
+        watcher.set_callback('poll_complete',
+                             lambda url, videos: videos and print(f"{url}: queued {len(videos)} new short(s)"))
+        watcher.set_callback('poll_failed', lambda url, error: print(f"{url}: poll failed: {error}"))
+        print(f"Watching {len(config.get('subscriptions'))} channel(s).")
+        watcher.start()
+    
+    server = None
+    if args.api:
+        from api_server import ControlServer
+        server = ControlServer(config, download_manager, port=args.port)
+        try:
+            server.start()
+        except OSError as e:
+            print(f"Control API could not listen on {server.host}:{server.port}: {e}")
+            if watcher:
+                watcher.stop()
+            download_manager.stop()
+            return
+        print(f"Control API listening on http://{server.host}:{server.port}/api/")
+    
+    print("Press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print("Stopping...")
+    finally:
+        if watcher:
+            watcher.stop()
+        if server:
+            server.stop()
+        download_manager.stop(drain=args.drain or None)
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="YouTube Downloader Pro")
+    parser.add_argument('--watch', action='store_true',
+                        help="run headless and poll subscribed channels for new shorts")
+    parser.add_argument('--subscribe', metavar='URL', help="add a channel to the watch list")
+    parser.add_argument('--unsubscribe', metavar='URL', help="remove a channel from the watch list")
+    parser.add_argument('--list', action='store_true', help="list subscribed channels")
+    parser.add_argument('--interval', type=int, help="poll interval in seconds for --subscribe")
+    parser.add_argument('--no-backfill', action='store_true',
+                        help="with --subscribe, skip shorts that already exist on the channel")
+    parser.add_argument('--output', metavar='DIR', help="download folder for watch mode")
+    parser.add_argument('--api', action='store_true',
+                        help="run headless and serve the local HTTP control API")
+    parser.add_argument('--port', type=int, help="port for --api (default from config)")
+    parser.add_argument('--queue', metavar='PATH',
+                        help="shared SQLite job queue; with --watch/--api this node coordinates")
+    parser.add_argument('--worker', action='store_true',
+                        help="run as a worker that downloads jobs from the shared --queue "
+                             "(--watch/--api then add to that queue)")
+    parser.add_argument('--drain', action='store_true',
+                        help="on Ctrl+C, let running downloads finish (up to shutdown_timeout seconds)")
+    parser.add_argument('--profile', action='store_true',
+                        help="profile each batch of downloads and write a report to ~/.yt_downloader/profiles")
+    return parser.parse_args(argv)
+
 if __name__ == "__main__":
-    from gui import main
-    main()
+    args = parse_args(sys.argv[1:])
+    if args.watch or args.api or args.worker or args.subscribe or args.unsubscribe or args.list:
+        headless_main(args)
+    else:
+        from gui import main
+        main(profile=args.profile)
@@ -0,0 +1,163 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from pathlib import Path
+from downloader import VideoDownloader
+from task_log import app_log
+
+class SourceStatus:
+    PENDING = "Pending"
+    ENUMERATING = "Enumerating"
+    FETCHING = "Fetching"
+    DONE = "Done"
+    FAILED = "Failed"
+    CANCELLED = "Cancelled"
+
+class SourceProgress:
+    def __init__(self, url):
+        self.url = url
+        self.status = SourceStatus.PENDING
+        self.total = 0
+        self.done = 0
+        self.duplicates = 0
+        self.videos = []
+        self.error = None
+
+class BatchFetcher:
+    """Fetch many channels/playlists/shorts at once through one bounded pool"""
+    
+    def __init__(self, config, progress_callback=None):
+        self.config = config
+        self.progress_callback = progress_callback
+        self.cancel_flag = threading.Event()
+        self.lock = threading.Lock()
+        self.seen_ids = set()
+        self.sources = []
+    
+    @staticmethod
+    def parse_sources(text):
+        """Split pasted text into unique URLs, skipping blanks and # comments"""
+        sources = []
+        seen = set()
+        for line in text.splitlines():
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            for url in line.split():
+                if url not in seen:
+                    seen.add(url)
+                    sources.append(url)
+        return sources
+    
+    @classmethod
+    def load_sources_file(cls, path):
+        """Read sources from a text file, one or more URLs per line"""
+        with open(Path(path), 'r', encoding='utf-8') as f:
+            return cls.parse_sources(f.read())
+    
+    def fetch(self, urls, known_ids=()):
+        """Enumerate all sources and return their videos, deduped by video ID"""
+        self.cancel_flag.clear()
+        self.sources = [SourceProgress(url) for url in urls]
+        self.seen_ids = set(known_ids)
+        max_workers = self.config.get('fetch_workers') or 8
+        
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='fetch') as pool:
+            listing = {pool.submit(self._enumerate, source): source for source in self.sources}
+            pending = []
+            
+            # Queue metadata lookups as soon as each source has been listed,
+            # so enumeration and lookups share the same worker slots
+            for future in as_completed(listing):
+                source = listing[future]
+                entries = future.result()
+                if entries is None:
+                    continue
+                
+                fresh = self._claim_new(source, entries)
+                if not fresh:
+                    self._finish(source)
+                    continue
+                
+                for index, entry in enumerate(fresh):
+                    pending.append(pool.submit(self._resolve, source, index, entry))
+            
+            wait(pending)
+        
+        videos = []
+        for source in self.sources:
+            videos.extend(video for video in source.videos if video)
+        return videos
+    
+    def cancel(self):
+        """Stop scheduling further lookups"""
+        self.cancel_flag.set()
+    
+    def _enumerate(self, source):
+        """List a single source's entries (runs in the pool)"""
+        if self.cancel_flag.is_set():
+            self._set_status(source, SourceStatus.CANCELLED)
+            return None
+        
+        self._set_status(source, SourceStatus.ENUMERATING)
+        downloader = VideoDownloader(self.config)
+        try:
+            if downloader.is_single_video_url(source.url):
+                return downloader.get_videos_from_url(source.url)
+            return downloader.list_entries(source.url)
+        except Exception as e:
+            source.error = str(e)
+            self._set_status(source, SourceStatus.FAILED)
+            return None
+    
+    def _claim_new(self, source, entries):
+        """Drop entries another source already claimed and reserve the rest"""
+        fresh = []
+        with self.lock:
+            for entry in entries:
+                video_id = entry.get('id')
+                if video_id in self.seen_ids:
+                    source.duplicates += 1
+                    continue
+                self.seen_ids.add(video_id)
+                fresh.append(entry)
+            
+            source.total = len(fresh)
+            source.videos = [None] * len(fresh)
+            source.status = SourceStatus.FETCHING
+        
+        self._notify(source)
+        return fresh
+    
+    def _resolve(self, source, index, entry):
+        """Fetch full metadata for one entry (runs in the pool)"""
+        if not self.cancel_flag.is_set():
+            try:
+                source.videos[index] = VideoDownloader(self.config).resolve_entry(entry)
+            except Exception:
+                source.videos[index] = None
+        
+        with self.lock:
+            source.done += 1
+            finished = source.done == source.total
+        
+        if finished:
+            self._finish(source)
+        else:
+            self._notify(source)
+    
+    def _finish(self, source):
+        if self.cancel_flag.is_set():
+            self._set_status(source, SourceStatus.CANCELLED)
+        else:
+            self._set_status(source, SourceStatus.DONE)
+    
+    def _set_status(self, source, status):
+        source.status = status
+        self._notify(source)
+    
+    def _notify(self, source):
+        if self.progress_callback:
+            try:
+                self.progress_callback(source)
+            except Exception as e:
+                app_log.error(f"Callback error: {e}")
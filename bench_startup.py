@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for YouTube Downloader Pro
+
+Measures how long it takes to import the GUI module and how long until the
+main window has painted its first frame. Run it before a release and append
+the results to a file to track startup time over time:
+
+    python bench_startup.py --runs 10 --json bench_results.jsonl
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+
+IMPORT_PROBE = """
+import sys, time
+t = time.perf_counter()
+import gui
+print(time.perf_counter() - t, 'yt_dlp' in sys.modules)
+"""
+
+FRAME_PROBE = """
+import tkinter as tk
+import gui
+root = tk.Tk()
+app = gui.ModernYTDownloader(root)
+root.update()
+root.wait_visibility()
+print('painted', flush=True)
+root.destroy()
+"""
+
+def run_probe(code):
+    return subprocess.run([sys.executable, '-c', code], cwd=ROOT,
+                          capture_output=True, text=True, timeout=60)
+
+def bench_import(runs):
+    times = []
+    loads_yt_dlp = False
+    for _ in range(runs):
+        result = run_probe(IMPORT_PROBE)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip())
+        elapsed, loaded = result.stdout.split()
+        times.append(float(elapsed))
+        loads_yt_dlp = loads_yt_dlp or loaded == 'True'
+    return times, loads_yt_dlp
+
+def bench_first_frame(runs):
+    # Wall time from process launch, so interpreter start-up is included
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = run_probe(FRAME_PROBE)
+        if 'painted' not in result.stdout:
+            return None, result.stderr.strip().splitlines()[-1:] or ['unknown error']
+        times.append(time.perf_counter() - start)
+    return times, None
+
+def summarize(times):
+    return {
+        'median_ms': round(statistics.median(times) * 1000, 1),
+        'min_ms': round(min(times) * 1000, 1),
+        'max_ms': round(max(times) * 1000, 1)
+    }
+
+def git_revision():
+    try:
+        result = subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=ROOT,
+                                capture_output=True, text=True)
+        return result.stdout.strip() or None
+    except OSError:
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import time and time-to-first-frame")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--json', metavar='FILE', help="append results as one JSON line")
+    args = parser.parse_args()
+    
+    import_times, loads_yt_dlp = bench_import(args.runs)
+    frame_times, frame_error = bench_first_frame(args.runs)
+    
+    record = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'python': sys.version.split()[0],
+        'runs': args.runs,
+        'import_gui': summarize(import_times),
+        'import_loads_yt_dlp': loads_yt_dlp,
+        'first_frame': summarize(frame_times) if frame_times else None
+    }
+    
+    print(f"import gui:      {record['import_gui']['median_ms']} ms (median of {args.runs})")
+    print(f"yt_dlp imported: {'yes - startup is paying for it!' if loads_yt_dlp else 'no'}")
+    if frame_times:
+        print(f"first frame:     {record['first_frame']['median_ms']} ms (median of {args.runs})")
+    else:
+        print(f"first frame:     skipped ({frame_error[0]})")
+    
+    if args.json:
+        with open(args.json, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+if __name__ == "__main__":
+    main()
@@ -7,17 +7,74 @@ class Config:
         self.config_dir = Path.home() / '.yt_downloader'
         self.config_file = self.config_dir / 'config.json'
         self.history_file = self.config_dir / 'history.json'
-        self.config_dir.mkdir(exist_ok=True)
+        self.watch_state_file = self.config_dir / 'watch_state.json'
+        self.session_file = self.config_dir / 'session.json'
         
         self.default_config = {
             'download_path': str(Path.home() / 'Downloads' / 'YouTube'),
             'quality': 'best',
             'max_concurrent': 3,
+            'max_concurrent_limit': 10,
             'auto_retry': True,
             'max_retries': 3,
             'download_subtitles': False,
             'embed_thumbnail': True,
-            'format_preference': 'mp4'
+            'format_preference': 'mp4',
+            'fetch_workers': 8,
+            'subscriptions': [],
+            'watch_interval': 3600,
+            'watch_jitter': 0.2,
+            'watch_min_spacing': 5,
+            'watch_workers': 2,
+            'watch_seen_limit': 500,
+            'watch_backfill': True,
+            'watch_task_history': 500,
+            'watch_reload_interval': 30,
+            'api_enabled': False,
+            'api_host': '127.0.0.1',
+            'api_port': 8765,
+            'api_token': '',
+            'api_refresh_interval': 0.25,
+            'job_queue_path': '',
+            'lease_seconds': 60,
+            'heartbeat_interval': 10,
+            'job_poll_interval': 1.0,
+            'output_layout': 'flat',
+            'filename_template': '%(title).150B [%(id)s].%(ext)s',
+            'staging_max_age': 2 * 86400,
+            'verify_downloads': True,
+            'verify_workers': 2,
+            'verify_hash': False,
+            'verify_size_tolerance': 0.1,
+            'dedupe': True,
+            'dedupe_link': 'auto',
+            'dedupe_skip_similar': False,
+            'disk_headroom': 1024 ** 3,
+            'disk_reserve_factor': 2.0,
+            'disk_default_estimate': 50 * 1024 ** 2,
+            'preallocate': False,
+            'rate_limit_rps': 2.0,
+            'rate_limit_burst': 4,
+            'rate_limit_min_rps': 0.2,
+            'rate_limit_max_rps': 10.0,
+            'rate_limit_increase': 0.05,
+            'rate_limit_cooldown': 30,
+            'rate_limit_max_cooldown': 600,
+            'rate_limit_retries': 3,
+            'shutdown_mode': 'abort',
+            'shutdown_timeout': 5,
+            'format_planner': True,
+            'format_min_abr': 96,
+            'format_progressive_slack': 0.25,
+            'thumbnail_previews': True,
+            'thumbnail_workers': 4,
+            'thumbnail_memory_items': 300,
+            'thumbnail_preview_size': [64, 36],
+            'library_catalog': True,
+            'library_search_limit': 200,
+            'log_console_level': 'error',
+            'profile_batches': False,
+            'profile_interval': 0.005
         }
         
         self.settings = self.load_config()
@@ -29,6 +86,7 @@ class Config:
         return self.default_config.copy()
     
     def save_config(self):
+        self.config_dir.mkdir(exist_ok=True)
         with open(self.config_file, 'w') as f:
             json.dump(self.settings, f, indent=2)
     
@@ -46,5 +104,59 @@ class Config:
         return []
     
     def save_history(self, history):
+        self.config_dir.mkdir(exist_ok=True)
         with open(self.history_file, 'w') as f:
             json.dump(history, f, indent=2)
+    
+    def add_subscription(self, url, interval=None, backfill=None):
+        subscriptions = [s for s in self.settings.get('subscriptions', []) if s['url'] != url]
+        subscription = {'url': url}
+        if interval:
+            subscription['interval'] = interval
+        if backfill is not None:
+            subscription['backfill'] = backfill
+        subscriptions.append(subscription)
+        self.set('subscriptions', subscriptions)
+    
+    def remove_subscription(self, url):
+        subscriptions = [s for s in self.settings.get('subscriptions', []) if s['url'] != url]
+        self.set('subscriptions', subscriptions)
+    
+    def reload_subscriptions(self):
+        """Re-read the subscription list from disk, where another process may have changed it"""
+        try:
+            with open(self.config_file, 'r') as f:
+                subscriptions = json.load(f).get('subscriptions')
+        except (OSError, ValueError):
+            subscriptions = None
+        if subscriptions is not None:
+            self.settings['subscriptions'] = subscriptions
+        return self.settings.get('subscriptions') or []
+    
+    def load_watch_state(self):
+        if self.watch_state_file.exists():
+            with open(self.watch_state_file, 'r') as f:
+                return json.load(f)
+        return {}
+    
+    def save_watch_state(self, state):
+        self.config_dir.mkdir(exist_ok=True)
+        with open(self.watch_state_file, 'w') as f:
+            json.dump(state, f)
+    
+    def load_session(self):
+        if self.session_file.exists():
+            try:
+                with open(self.session_file, 'r') as f:
+                    return json.load(f)
+            except ValueError:
+                return []
+        return []
+    
+    def save_session(self, tasks):
+        # Written to a temp file first: a torn checkpoint would lose the whole queue
+        self.config_dir.mkdir(exist_ok=True)
+        temp = self.session_file.with_suffix('.tmp')
+        with open(temp, 'w') as f:
+            json.dump(tasks, f)
+        os.replace(temp, self.session_file)
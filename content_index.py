@@ -0,0 +1,321 @@
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import threading
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+INDEX_FILE = '.content.jsonl'
+PARTIAL_BYTES = 64 * 1024
+FICLONE = 0x40049409
+
+class ContentIndex:
+    """Content index of downloaded files for cross-channel dedupe
+    
+    Files are compared in three cheap-to-expensive steps: size, a partial
+    hash of the first and last 64 KB, then a full hash. Hashes are only
+    computed when the previous step collides, and stored so each file is
+    hashed at most once. Identical files are replaced by a reflink or
+    hardlink to the copy already on disk.
+    
+    Embedded metadata (title, uploader, source URL) and cover art make two
+    copies of the same video differ byte for byte, so files of the same
+    length are also compared by a hash of their audio/video packets only.
+    """
+    
+    _instances = {}
+    _instances_lock = threading.Lock()
+    
+    def __init__(self, root):
+        self.root = Path(root)
+        self.index_file = self.root / INDEX_FILE
+        self.lock = threading.Lock()
+        self.files = None
+        self.by_size = {}
+        self.by_duration = {}
+        self.stats = {}
+    
+    @classmethod
+    def for_path(cls, root):
+        """Shared index instance per download folder"""
+        key = os.path.abspath(root)
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(key)
+            return cls._instances[key]
+    
+    def _load(self):
+        self.files = {}
+        self.by_size = {}
+        self.by_duration = {}
+        self.stats = {
+            'files': 0,
+            'downloaded_bytes': 0,
+            'download_seconds': 0.0,
+            'linked': 0,
+            'linked_bytes': 0,
+            'skipped': 0,
+            'skipped_bytes': 0,
+            'skipped_seconds': 0.0
+        }
+        if not self.index_file.exists():
+            return
+        with open(self.index_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # torn last line from a crash
+                self._apply(record)
+    
+    def _apply(self, record):
+        event = record.pop('event', 'file')
+        if event == 'file':
+            old = self.files.get(record['path'])
+            if old:
+                self.by_size.get(old['size'], set()).discard(record['path'])
+                self.by_duration.get(_duration_key(old), set()).discard(record['path'])
+            else:
+                self.stats['files'] += 1
+            self.files[record['path']] = record
+            self.by_size.setdefault(record['size'], set()).add(record['path'])
+            self.by_duration.setdefault(_duration_key(record), set()).add(record['path'])
+        else:
+            for key, value in record.items():
+                self.stats[key] = self.stats.get(key, 0) + value
+    
+    def _append(self, record):
+        self._apply(dict(record))
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.index_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + '\n')
+    
+    def _ensure_loaded(self):
+        if self.files is None:
+            self._load()
+    
+    def add(self, path, video_id, expected_size=None, duration=None, seconds=None, link_mode='auto',
+            channel=None, title=None):
+        """Index a finished download; returns the file it was linked to, if any"""
+        path = Path(path)
+        size = path.stat().st_size
+        relpath = os.path.relpath(path, self.root)
+        record = {
+            'path': relpath,
+            'video_id': video_id,
+            'size': size,
+            'expected_size': expected_size,
+            'duration': duration,
+            'channel': channel,
+            'title': title
+        }
+        
+        with self.lock:
+            self._ensure_loaded()
+            if seconds:
+                self._append({'event': 'stats', 'downloaded_bytes': size, 'download_seconds': seconds})
+            
+            original = self._find_identical(path, record) or self._find_same_media(path, record)
+            if original:
+                if link_file(self.root / original, path, link_mode):
+                    self._append({'event': 'stats', 'linked': 1, 'linked_bytes': size})
+                else:
+                    original = None
+            
+            self._append(record)
+            return str(self.root / original) if original else None
+    
+    def _find_identical(self, path, record):
+        candidates = [p for p in self.by_size.get(record['size'], ()) if p != record['path']]
+        if not candidates:
+            return None
+        
+        record['partial'] = partial_hash(path)
+        for candidate in candidates:
+            other = self.files[candidate]
+            other_path = self.root / candidate
+            if not other_path.exists():
+                continue
+            if not other.get('partial'):
+                other['partial'] = partial_hash(other_path)
+                self._append(dict(other))
+            if other['partial'] != record['partial']:
+                continue
+            
+            record.setdefault('full', full_hash(path))
+            if not other.get('full'):
+                other['full'] = full_hash(other_path)
+                self._append(dict(other))
+            if other['full'] == record['full']:
+                return candidate
+        return None
+    
+    def _find_same_media(self, path, record):
+        key = _duration_key(record)
+        if key is None:
+            return None
+        candidates = [p for p in self.by_duration.get(key, ()) if p != record['path']]
+        if not candidates:
+            return None
+        
+        record['media'] = media_hash(path)
+        if not record['media']:
+            return None
+        for candidate in candidates:
+            other = self.files[candidate]
+            other_path = self.root / candidate
+            if not other_path.exists():
+                continue
+            if not other.get('media'):
+                other['media'] = media_hash(other_path)
+                if not other['media']:
+                    continue
+                self._append(dict(other))
+            if other['media'] == record['media']:
+                return candidate
+        return None
+    
+    def find_similar(self, expected_size, duration, channel=None, title=None):
+        """File that is almost certainly the same video as a candidate download
+        
+        Needs the exact announced size, the duration within a second and the
+        same uploader or title. Size and length alone match unrelated shorts
+        too often to skip a download on.
+        """
+        if not expected_size or not duration:
+            return None
+        
+        key = int(round(duration))
+        with self.lock:
+            self._ensure_loaded()
+            for nearby in (key - 1, key, key + 1):
+                for relpath in self.by_duration.get(nearby, ()):
+                    record = self.files[relpath]
+                    if record.get('expected_size') != expected_size or abs(record['duration'] - duration) > 1:
+                        continue
+                    if not (_same_text(record.get('channel'), channel) or _same_text(record.get('title'), title)):
+                        continue
+                    path = self.root / relpath
+                    if path.exists():
+                        return str(path)
+        return None
+    
+    def record_skip(self, path, video_id, expected_size, duration, channel=None, title=None):
+        """Index a file that was linked into place instead of downloaded"""
+        with self.lock:
+            self._ensure_loaded()
+            rate = self._download_rate()
+            self._append({
+                'event': 'stats',
+                'skipped': 1,
+                'skipped_bytes': expected_size,
+                'skipped_seconds': expected_size / rate if rate else 0.0
+            })
+            self._append({
+                'path': os.path.relpath(path, self.root),
+                'video_id': video_id,
+                'size': os.path.getsize(path),
+                'expected_size': expected_size,
+                'duration': duration,
+                'channel': channel,
+                'title': title
+            })
+    
+    def _download_rate(self):
+        if not self.stats['download_seconds']:
+            return None
+        return self.stats['downloaded_bytes'] / self.stats['download_seconds']
+    
+    def report(self):
+        """Bytes and time saved by dedupe so far"""
+        with self.lock:
+            self._ensure_loaded()
+            stats = dict(self.stats)
+        stats['bytes_saved'] = stats['linked_bytes'] + stats['skipped_bytes']
+        stats['time_saved'] = stats['skipped_seconds']
+        return stats
+
+def _same_text(a, b):
+    return bool(a and b) and ' '.join(a.split()).casefold() == ' '.join(b.split()).casefold()
+
+def _duration_key(record):
+    return int(round(record['duration'])) if record.get('duration') else None
+
+def partial_hash(path):
+    """Hash of the size plus the first and last 64 KB"""
+    size = os.path.getsize(path)
+    digest = hashlib.sha256(str(size).encode())
+    with open(path, 'rb') as f:
+        digest.update(f.read(PARTIAL_BYTES))
+        if size > PARTIAL_BYTES:
+            f.seek(max(PARTIAL_BYTES, size - PARTIAL_BYTES))
+            digest.update(f.read(PARTIAL_BYTES))
+    return digest.hexdigest()
+
+def full_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def media_hash(path):
+    """Hash of the audio and video packets, ignoring tags and cover art
+    
+    None without ffmpeg or for a file it can't read.
+    """
+    ffmpeg = shutil.which('ffmpeg')
+    if not ffmpeg:
+        return None
+    try:
+        # 0:V leaves out attached pictures (embedded thumbnails)
+        result = subprocess.run(
+            [ffmpeg, '-v', 'error', '-i', str(path), '-map', '0:V?', '-map', '0:a?',
+             '-c', 'copy', '-f', 'streamhash', '-hash', 'sha256', '-'],
+            capture_output=True, text=True, timeout=120)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if result.returncode != 0 or not result.stdout.strip():
+        return None
+    return hashlib.sha256(result.stdout.encode()).hexdigest()
+
+def link_file(source, destination, mode='auto'):
+    """Replace destination with a reflink or hardlink of source; False if impossible"""
+    destination = Path(destination)
+    temp = destination.with_name(destination.name + '.link.tmp')
+    try:
+        if mode in ('auto', 'reflink') and _reflink(source, temp):
+            os.replace(temp, destination)
+            return True
+        if mode in ('auto', 'hardlink'):
+            os.link(source, temp)
+            os.replace(temp, destination)
+            return True
+    except OSError:
+        pass
+    try:
+        os.remove(temp)
+    except OSError:
+        pass
+    return False
+
+def _reflink(source, destination):
+    """Copy-on-write clone (btrfs, XFS); False where the filesystem can't"""
+    if fcntl is None:
+        return False
+    try:
+        with open(source, 'rb') as src, open(destination, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        return True
+    except OSError:
+        try:
+            os.remove(destination)
+        except OSError:
+            pass
+        return False
@@ -0,0 +1,116 @@
+import ctypes
+import ctypes.util
+import os
+import shutil
+import sys
+import threading
+
+FALLOC_FL_KEEP_SIZE = 0x01
+
+class DiskBudget:
+    """Reserve free disk space for downloads before they start
+    
+    Each task reserves its estimated size against the free space of its
+    download folder minus a headroom. Tasks that don't fit wait until running
+    downloads release their reservations, instead of all failing at once when
+    the disk fills up. Reservations are held until the download finishes, so
+    the estimate errs on the safe side while files are being written.
+    """
+    
+    def __init__(self, config):
+        self.config = config
+        self.condition = threading.Condition()
+        self.reservations = {}
+    
+    def estimate(self, video_info):
+        """Bytes to reserve for a video: announced size times a safety factor"""
+        size = video_info.get('filesize') or self.config.get('disk_default_estimate')
+        # Separate video/audio streams sit next to the merged file until
+        # ffmpeg is done, so peak usage is about twice the final size
+        return int(size * self.config.get('disk_reserve_factor'))
+    
+    def try_reserve(self, task_id, path, size):
+        """Reserve space for a task if it fits; returns True on success"""
+        with self.condition:
+            if task_id in self.reservations:
+                return True
+            try:
+                if self._available(path) < size:
+                    return False
+                device = self._device(path)
+            except OSError:
+                return True  # can't measure the disk; don't hold downloads back
+            self.reservations[task_id] = (device, size)
+            return True
+    
+    def reserve(self, task_id, path, size, should_stop, timeout=10):
+        """Block until the reservation fits or should_stop() returns True"""
+        with self.condition:
+            while not self.try_reserve(task_id, path, size):
+                if should_stop():
+                    return False
+                # Re-check periodically too: space can be freed outside the app
+                self.condition.wait(timeout)
+            return True
+    
+    def release(self, task_id):
+        with self.condition:
+            if self.reservations.pop(task_id, None) is not None:
+                self.condition.notify_all()
+    
+    def wake(self):
+        """Wake waiting tasks so they can notice cancellation or shutdown"""
+        with self.condition:
+            self.condition.notify_all()
+    
+    def _available(self, path):
+        device = self._device(path)
+        reserved = sum(size for dev, size in self.reservations.values() if dev == device)
+        free = shutil.disk_usage(self._existing(path)).free
+        return free - reserved - self.config.get('disk_headroom')
+    
+    def _device(self, path):
+        return os.stat(self._existing(path)).st_dev
+    
+    @staticmethod
+    def _existing(path):
+        # The download folder may not exist yet; measure its nearest parent
+        path = os.path.abspath(path)
+        while not os.path.exists(path):
+            parent = os.path.dirname(path)
+            if parent == path:
+                break
+            path = parent
+        return path
+
+def _load_fallocate():
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        fallocate = libc.fallocate
+    except (OSError, AttributeError):
+        return None
+    fallocate.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_longlong, ctypes.c_longlong]
+    return fallocate
+
+_fallocate = _load_fallocate()
+
+def preallocate(path, size):
+    """Allocate disk blocks for a file that is still being written
+    
+    Uses fallocate with FALLOC_FL_KEEP_SIZE, so the file's length does not
+    change and appending writers (yt-dlp's .part files) are unaffected, but
+    the filesystem can lay the file out contiguously. Linux only; a no-op
+    elsewhere or on filesystems that don't support it.
+    """
+    if _fallocate is None or not size:
+        return False
+    try:
+        fd = os.open(path, os.O_WRONLY)
+    except OSError:
+        return False
+    try:
+        return _fallocate(fd, FALLOC_FL_KEEP_SIZE, 0, int(size)) == 0
+    finally:
+        os.close(fd)
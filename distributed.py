@@ -0,0 +1,504 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from download_manager import DownloadManager, DownloadTask
+from downloader import DownloadStatus
+from task_log import app_log
+
+FINISHED = (DownloadStatus.COMPLETED, DownloadStatus.FAILED, DownloadStatus.CANCELLED)
+
+def _with_ids(videos):
+    # Jobs are keyed by video id; anything without one can't be queued
+    keep = [v for v in videos if v.get('id')]
+    for video in videos:
+        if not video.get('id'):
+            app_log.warning("Skipped a video without an id", url=video.get('url'))
+    return keep
+
+def open_job_queue(config, path=None):
+    """Open the shared job queue configured by 'job_queue_path'"""
+    max_attempts = 1 + (config.get('max_retries') if config.get('auto_retry') else 0)
+    return SQLiteJobQueue(path or config.get('job_queue_path'),
+                          lease_seconds=config.get('lease_seconds'),
+                          max_attempts=max_attempts)
+
+class SQLiteJobQueue:
+    """Job queue shared by several processes/machines through one SQLite file
+    
+    Workers claim jobs under a time-limited lease and keep it alive with
+    heartbeats. A job whose lease runs out (crashed or partitioned worker) goes
+    back to the queue, and each claim gets a fresh token so a stale worker can
+    no longer report on a job that was handed to someone else. The journal is
+    kept in DELETE mode because WAL does not work on network filesystems.
+    """
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            video_id TEXT NOT NULL,
+            output_path TEXT NOT NULL,
+            video_info TEXT NOT NULL,
+            status TEXT NOT NULL,
+            worker TEXT,
+            lease_token TEXT,
+            lease_until REAL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            progress INTEGER NOT NULL DEFAULT 0,
+            filepath TEXT,
+            error TEXT,
+            version INTEGER NOT NULL DEFAULT 0,
+            UNIQUE (video_id, output_path)
+        );
+        CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_until);
+        CREATE INDEX IF NOT EXISTS jobs_version ON jobs (version);
+        CREATE TABLE IF NOT EXISTS workers (
+            worker_id TEXT PRIMARY KEY,
+            host TEXT,
+            heartbeat_at REAL
+        );
+    """
+    
+    def __init__(self, path, lease_seconds=60, max_attempts=3):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=DELETE")
+        self.conn.execute("PRAGMA busy_timeout=30000")
+        self.conn.executescript(self.SCHEMA)
+    
+    def close(self):
+        with self.lock:
+            self.conn.close()
+    
+    def _transaction(self, fn, *args):
+        # BEGIN IMMEDIATE takes the write lock up front, so two processes
+        # can never both read a job as claimable and then both claim it
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(*args)
+                self.conn.execute("COMMIT")
+                return result
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+    
+    def _next_version(self):
+        row = self.conn.execute("SELECT COALESCE(MAX(version), 0) + 1 FROM jobs").fetchone()
+        return row[0]
+    
+    def enqueue(self, videos, output_path):
+        """Add videos; returns {video_id: job_id} including already-queued ones"""
+        def insert():
+            version = self._next_version()
+            job_ids = {}
+            for video in videos:
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO jobs (video_id, output_path, video_info, status, version) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (video['id'], output_path, json.dumps(video), DownloadStatus.QUEUED, version))
+                # A video that is already queued or done is never queued twice;
+                # failed/cancelled ones get a fresh set of attempts. Bumping the
+                # version makes the coordinator pick up the current state.
+                self.conn.execute(
+                    "UPDATE jobs SET status = CASE WHEN status IN (?, ?) THEN ? ELSE status END, "
+                    "attempts = CASE WHEN status IN (?, ?) THEN 0 ELSE attempts END, version = ? "
+                    "WHERE video_id = ? AND output_path = ?",
+                    (DownloadStatus.FAILED, DownloadStatus.CANCELLED, DownloadStatus.QUEUED,
+                     DownloadStatus.FAILED, DownloadStatus.CANCELLED, version,
+                     video['id'], output_path))
+                row = self.conn.execute(
+                    "SELECT id FROM jobs WHERE video_id = ? AND output_path = ?",
+                    (video['id'], output_path)).fetchone()
+                job_ids[video['id']] = row[0]
+            return job_ids
+        return self._transaction(insert)
+    
+    def claim(self, worker_id):
+        """Lease the oldest runnable job to a worker, or return None"""
+        def take():
+            # Workers recover crashed peers' jobs themselves, so the queue
+            # keeps draining even while no coordinator is running
+            self._requeue_expired()
+            now = time.time()
+            row = self.conn.execute(
+                "SELECT id, video_info, output_path FROM jobs WHERE status = ? ORDER BY id LIMIT 1",
+                (DownloadStatus.QUEUED,)).fetchone()
+            if row is None:
+                return None
+            
+            token = uuid.uuid4().hex
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, worker = ?, lease_token = ?, lease_until = ?, "
+                "attempts = attempts + 1, progress = 0, error = NULL, version = ? WHERE id = ?",
+                (DownloadStatus.DOWNLOADING, worker_id, token, now + self.lease_seconds,
+                 self._next_version(), row[0]))
+            return {
+                'job_id': row[0],
+                'video_info': json.loads(row[1]),
+                'output_path': row[2],
+                'lease_token': token
+            }
+        return self._transaction(take)
+    
+    def heartbeat(self, worker_id, leases):
+        """Extend leases {job_id: (token, progress)}; returns job ids that were lost"""
+        def extend():
+            now = time.time()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO workers (worker_id, host, heartbeat_at) VALUES (?, ?, ?)",
+                (worker_id, socket.gethostname(), now))
+            version = self._next_version()
+            lost = []
+            for job_id, (token, progress) in leases.items():
+                cursor = self.conn.execute(
+                    "UPDATE jobs SET lease_until = ?, progress = ?, version = ? "
+                    "WHERE id = ? AND lease_token = ? AND status = ?",
+                    (now + self.lease_seconds, progress, version, job_id, token,
+                     DownloadStatus.DOWNLOADING))
+                if cursor.rowcount == 0:
+                    lost.append(job_id)
+            return lost
+        return self._transaction(extend)
+    
+    def finish(self, job_id, token, status, error=None, filepath=None):
+        """Report a job's outcome; ignored if the lease was lost meanwhile"""
+        def report():
+            row = self.conn.execute(
+                "SELECT attempts FROM jobs WHERE id = ? AND lease_token = ?",
+                (job_id, token)).fetchone()
+            if row is None:
+                return False
+            
+            final = status
+            if status == DownloadStatus.FAILED and row[0] < self.max_attempts:
+                final = DownloadStatus.QUEUED
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, filepath = ?, lease_token = NULL, "
+                "lease_until = NULL, progress = ?, version = ? WHERE id = ?",
+                (final, error, filepath, 100 if final == DownloadStatus.COMPLETED else 0,
+                 self._next_version(), job_id))
+            return True
+        return self._transaction(report)
+    
+    def release(self, job_id, token):
+        """Hand a leased job back unfinished (worker shutting down); not counted as an attempt"""
+        def update():
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, worker = NULL, lease_token = NULL, lease_until = NULL, "
+                "attempts = MAX(attempts - 1, 0), progress = 0, version = ? "
+                "WHERE id = ? AND lease_token = ? AND status = ?",
+                (DownloadStatus.QUEUED, self._next_version(), job_id, token,
+                 DownloadStatus.DOWNLOADING))
+        self._transaction(update)
+    
+    def cancel(self, job_id):
+        """Cancel a job; a worker holding it finds out on its next heartbeat"""
+        def update():
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, lease_token = NULL, version = ? "
+                "WHERE id = ? AND status IN (?, ?)",
+                (DownloadStatus.CANCELLED, self._next_version(), job_id,
+                 DownloadStatus.QUEUED, DownloadStatus.DOWNLOADING))
+        self._transaction(update)
+    
+    def requeue_expired(self):
+        """Put jobs with expired leases back in the queue (or fail them)"""
+        self._transaction(self._requeue_expired)
+    
+    def _requeue_expired(self):
+        self.conn.execute(
+            "UPDATE jobs SET status = CASE WHEN attempts < ? THEN ? ELSE ? END, "
+            "error = 'Worker lease expired', lease_token = NULL, lease_until = NULL, version = ? "
+            "WHERE status = ? AND lease_until < ?",
+            (self.max_attempts, DownloadStatus.QUEUED, DownloadStatus.FAILED, self._next_version(),
+             DownloadStatus.DOWNLOADING, time.time()))
+    
+    def changes_since(self, version):
+        """Jobs updated after the given version, plus the newest version seen"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, status, worker, progress, filepath, error, version FROM jobs "
+                "WHERE version > ? ORDER BY version", (version,)).fetchall()
+        changes = [{
+            'job_id': r[0],
+            'status': r[1],
+            'worker': r[2],
+            'progress': r[3],
+            'filepath': r[4],
+            'error': r[5]
+        } for r in rows]
+        return changes, (rows[-1][6] if rows else version)
+    
+    def workers(self, max_age=None):
+        """Workers that sent a heartbeat recently"""
+        max_age = max_age or self.lease_seconds
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT worker_id, host, heartbeat_at FROM workers WHERE heartbeat_at > ?",
+                (time.time() - max_age,)).fetchall()
+        return [{'worker_id': r[0], 'host': r[1], 'heartbeat_at': r[2]} for r in rows]
+
+class CoordinatorManager(DownloadManager):
+    """DownloadManager that hands tasks to remote workers through a job queue
+    
+    Tasks are tracked locally exactly like a normal manager so the GUI, API
+    and stats keep working; a sync thread mirrors job state back into them.
+    """
+    
+    def __init__(self, config, job_queue):
+        super().__init__(config)
+        self.job_queue = job_queue
+        self.jobs = {}
+        self.version = 0
+        self.sync_thread = None
+        self.wakeup = threading.Event()
+    
+    def add_videos(self, videos, output_path):
+        """Add multiple videos to the shared job queue"""
+        videos = _with_ids(videos)
+        if not videos:
+            return
+        job_ids = self.job_queue.enqueue(videos, output_path)
+        
+        with self.lock:
+            for video in videos:
+                job_id = job_ids[video['id']]
+                existing = self.jobs.get(job_id)
+                if existing and existing.status not in FINISHED:
+                    continue
+                task = DownloadTask(video, output_path)
+                task.job_id = job_id
+                self.jobs[job_id] = task
+                self.tasks.append(task)
+        
+        self._notify_callback('queue_update')
+        
+        if not self.running:
+            self.start()
+    
+    def start(self):
+        """Start syncing job state from the shared queue"""
+        if self.running:
+            return
+        
+        self.running = True
+        self.sync_thread = threading.Thread(target=self._sync_loop, name='job-sync', daemon=True)
+        self.sync_thread.start()
+    
+    def stop(self, drain=None, timeout=None):
+        # Job state already lives in the shared queue; nothing to checkpoint
+        self.running = False
+        self.wakeup.set()
+        if self.sync_thread and self.sync_thread.is_alive():
+            self.sync_thread.join(timeout=5)
+    
+    def set_max_concurrent(self, count):
+        # Concurrency belongs to each worker node in distributed mode
+        self.config.set('max_concurrent', count)
+    
+    def prune_finished(self, keep):
+        super().prune_finished(keep)
+        self._forget_jobs()
+    
+    def clear_completed(self):
+        super().clear_completed()
+        self._forget_jobs()
+    
+    def _forget_jobs(self):
+        # Stop tracking jobs whose task rows were dropped
+        with self.lock:
+            kept = set(map(id, self.tasks))
+            self.jobs = {job_id: task for job_id, task in self.jobs.items() if id(task) in kept}
+    
+    def cancel_task(self, task):
+        """Cancel a task wherever it is running"""
+        if task.status in FINISHED:
+            return
+        self.job_queue.cancel(task.job_id)
+        self.wakeup.set()
+    
+    def _sync_loop(self):
+        interval = self.config.get('job_poll_interval')
+        while self.running:
+            try:
+                self.job_queue.requeue_expired()
+                self._apply_changes()
+            except sqlite3.Error as e:
+                app_log.error(f"Job queue sync error: {e}")
+            self.wakeup.wait(interval)
+            self.wakeup.clear()
+    
+    def _apply_changes(self):
+        changes, self.version = self.job_queue.changes_since(self.version)
+        finished = False
+        for change in changes:
+            task = self.jobs.get(change['job_id'])
+            if task is None:
+                continue
+            
+            previous = task.status
+            task.status = change['status']
+            task.progress = change['progress']
+            task.error = change['error']
+            task.filepath = change['filepath']
+            task.worker = change['worker']
+            if task.status == DownloadStatus.DOWNLOADING and previous != task.status:
+                task.started_at = datetime.now()
+            if task.status != previous:
+                # The worker's own log stays on its node; record what we see
+                task.log.info(task.status, worker=task.worker, error=task.error)
+            
+            self._notify_callback('task_update', task)
+            if task.status in FINISHED and previous not in FINISHED:
+                task.completed_at = datetime.now()
+                self._add_to_catalog(task)
+                self._notify_callback('download_complete', task)
+                finished = True
+        
+        if finished:
+            self.prune_finished(self.config.get('watch_task_history'))
+
+class WorkerManager(DownloadManager):
+    """DownloadManager whose workers pull tasks from a shared job queue"""
+    
+    def __init__(self, config, job_queue, worker_id=None):
+        super().__init__(config)
+        self.job_queue = job_queue
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.heartbeat_thread = None
+        self.idle = threading.Event()
+    
+    def start(self):
+        if self.running:
+            return
+        
+        self.idle.clear()
+        super().start()
+        self._start_profile()
+        self.heartbeat_thread = threading.Thread(target=self._heartbeat_loop, name='heartbeat', daemon=True)
+        self.heartbeat_thread.start()
+    
+    def stop(self, drain=None, timeout=None):
+        self.running = False
+        self.idle.set()
+        super().stop(drain, timeout)
+    
+    def add_videos(self, videos, output_path):
+        """Add videos to the shared job queue (from --watch or the API)
+        
+        Workers only run jobs they claimed, so this goes through the queue
+        like on any other node instead of into the local pending list.
+        """
+        videos = _with_ids(videos)
+        if videos:
+            self.job_queue.enqueue(videos, output_path)
+    
+    def _worker(self):
+        """Claim jobs from the shared queue until stopped"""
+        poll_interval = self.config.get('job_poll_interval')
+        
+        while True:
+            with self.lock:
+                if self._retire():
+                    return
+            
+            try:
+                job = self.job_queue.claim(self.worker_id)
+            except sqlite3.Error as e:
+                app_log.error(f"Job queue claim error: {e}")
+                job = None
+            
+            if job is None:
+                # Other nodes add jobs, so the shared queue has to be polled
+                self.idle.wait(poll_interval)
+                continue
+            
+            task = DownloadTask(job['video_info'], job['output_path'])
+            task.job_id = job['job_id']
+            task.lease_token = job['lease_token']
+            task.log.info("Claimed from the job queue", job=task.job_id, worker=self.worker_id)
+            with self.lock:
+                self.tasks.append(task)
+            self._notify_callback('queue_update')
+            
+            self._download_task(task)
+    
+    def checkpoint(self):
+        """Hand unfinished jobs back to the shared queue right away
+        
+        Otherwise they would sit leased to this stopped worker until the
+        lease expires.
+        """
+        with self.lock:
+            unfinished = [t for t in self.tasks if t.status not in FINISHED and hasattr(t, 'lease_token')]
+        for task in unfinished:
+            try:
+                self.job_queue.release(task.job_id, task.lease_token)
+            except sqlite3.Error as e:
+                app_log.error(f"Job queue release error: {e}")
+    
+    def _batch_done(self):
+        # Jobs keep arriving from the shared queue: profile until stop()
+        return False
+    
+    def _task_finished(self, task):
+        super()._task_finished(task)
+        self._report(task)
+        self.prune_finished(self.config.get('watch_task_history'))
+    
+    def _requeue(self, task, error):
+        # Retries are the shared queue's job so any node can pick it up
+        task.status = DownloadStatus.FAILED
+        task.error = f"Verification failed: {error}"
+        self._task_finished(task)
+    
+    def _report(self, task):
+        # Retry for a while: losing the report would make the job run twice
+        for attempt in range(5):
+            try:
+                self.job_queue.finish(task.job_id, task.lease_token, task.status,
+                                      task.error, task.filepath)
+                return
+            except sqlite3.Error as e:
+                app_log.error(f"Job queue report error: {e}")
+                time.sleep(2 ** attempt)
+    
+    def _heartbeat_loop(self):
+        interval = self.config.get('heartbeat_interval')
+        while self.running:
+            with self.lock:
+                running = [t for t in self.tasks
+                           if t.status in (DownloadStatus.WAITING, DownloadStatus.DOWNLOADING,
+                                           DownloadStatus.VERIFYING)
+                           and hasattr(t, 'lease_token')]
+            leases = {t.job_id: (t.lease_token, t.progress) for t in running}
+            
+            try:
+                lost = self.job_queue.heartbeat(self.worker_id, leases)
+            except sqlite3.Error as e:
+                app_log.error(f"Job queue heartbeat error: {e}")
+                lost = []
+            
+            # Another worker owns (or the coordinator cancelled) these jobs now;
+            # stop downloading them so the same short is never fetched twice
+            for task in running:
+                if task.job_id in lost:
+                    if task.status == DownloadStatus.WAITING:
+                        task.status = DownloadStatus.CANCELLED
+                        self.disk_budget.wake()
+                        continue
+                    with self.lock:
+                        downloader = self.active_downloads.get(task.id)
+                    if downloader:
+                        # The new owner may be writing to the same staging folder
+                        downloader.cancel(keep_partial=True)
+            
+            self.idle.wait(interval)
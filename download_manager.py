@@ -1,10 +1,25 @@
 import threading
-import queue
+import itertools
+import os
+import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from downloader import VideoDownloader, DownloadStatus
+from output_layout import FileIndex, OutputLayout
+from content_index import ContentIndex
+from verifier import FileVerifier
+from disk_budget import DiskBudget, preallocate
+from library_catalog import LibraryCatalog
+from task_log import TaskLog, app_log, configure as configure_logging
+from profiler import SamplingProfiler
 
 class DownloadTask:
+    _ids = itertools.count(1)
+    
     def __init__(self, video_info, output_path):
+        self.id = next(DownloadTask._ids)
         self.video_info = video_info
         self.output_path = output_path
         self.status = DownloadStatus.QUEUED
@@ -12,18 +27,72 @@ class DownloadTask:
         self.speed = ""
         self.eta = ""
         self.error = None
+        self.filepath = None
+        self.expected_size = None
+        self.expected_duration = None
+        self.attempts = 0
+        self.reused = False
         self.started_at = None
         self.completed_at = None
+        self.log = TaskLog(f"task {self.id}")
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'video_id': self.video_info.get('id'),
+            'title': self.video_info.get('title'),
+            'url': self.video_info.get('url'),
+            'status': self.status,
+            'progress': self.progress,
+            'speed': self.speed,
+            'eta': self.eta,
+            'error': self.error
+        }
+    
+    def checkpoint(self):
+        """State needed to pick the task up again in a later session"""
+        return {
+            'video_info': self.video_info,
+            'output_path': self.output_path,
+            'status': self.status,
+            'error': self.error,
+            'filepath': self.filepath,
+            'expected_size': self.expected_size,
+            'expected_duration': self.expected_duration,
+            'attempts': self.attempts
+        }
+    
+    @classmethod
+    def from_checkpoint(cls, state):
+        task = cls(state['video_info'], state['output_path'])
+        for key in ('error', 'filepath', 'expected_size', 'expected_duration', 'attempts'):
+            setattr(task, key, state.get(key))
+        task.attempts = task.attempts or 0
+        return task
         
 class DownloadManager:
     def __init__(self, config):
         self.config = config
         self.tasks = []
-        self.queue = queue.Queue()
+        self.pending = deque()
         self.active_downloads = {}
         self.lock = threading.Lock()
+        # Idle workers sleep on this until there is work, a resize or a stop
+        self.work_available = threading.Condition(self.lock)
+        # Downloads cancelled by an aborting stop(), as opposed to by the user
+        self.interrupted = set()
         self.running = False
         self.workers = []
+        self.max_workers = config.get('max_concurrent')
+        # Bumped on every notification so observers can cheaply tell whether
+        # anything changed without taking the lock
+        self._revisions = itertools.count(1)
+        self.revision = 0
+        self.verify_pool = None
+        self.verifier = FileVerifier(config)
+        self.disk_budget = DiskBudget(config)
+        self.profiler = None
+        configure_logging(config)
         self.callbacks = {
             'task_update': None,
             'queue_update': None,
@@ -38,9 +107,12 @@ class DownloadManager:
         with self.lock:
             for video in videos:
                 task = DownloadTask(video, output_path)
+                task.log.info("Queued", url=video.get('url'))
                 self.tasks.append(task)
-                self.queue.put(task)
+                self.pending.append(task)
+            self.work_available.notify(len(videos))
         
+        self._start_profile()
         self._notify_callback('queue_update')
         
         if not self.running:
@@ -52,79 +124,235 @@ class DownloadManager:
             return
         
         self.running = True
-        max_workers = self.config.get('max_concurrent')
+        self.max_workers = self.config.get('max_concurrent')
         
-        for i in range(max_workers):
-            worker = threading.Thread(target=self._worker, daemon=True)
-            worker.start()
-            self.workers.append(worker)
+        with self.lock:
+            self.interrupted.clear()
+            # Tasks a previous stop() held back while waiting for disk space
+            # or interrupted mid-download are Queued again but no longer pending
+            pending = set(map(id, self.pending))
+            self.pending.extend(t for t in self.tasks
+                                if t.status == DownloadStatus.QUEUED and id(t) not in pending)
+            for i in range(self.max_workers):
+                self._spawn_worker()
     
-    def stop(self):
-        """Stop all downloads"""
-        self.running = False
+    def _spawn_worker(self):
+        worker = threading.Thread(target=self._worker, name='download', daemon=True)
+        self.workers.append(worker)
+        worker.start()
+    
+    def set_max_concurrent(self, count):
+        """Change the number of download workers, applying it to a running pool"""
+        self.config.set('max_concurrent', count)
+        with self.lock:
+            self.max_workers = count
+            if self.running:
+                # Surplus workers retire themselves after their current task
+                for i in range(count - len(self.workers)):
+                    self._spawn_worker()
+                self.work_available.notify_all()
+        self._notify_callback('queue_update')
+    
+    def stop(self, drain=None, timeout=None):
+        """Stop all downloads and checkpoint every task
+        
+        Queued tasks are not started any more. With drain, running downloads
+        may finish until the deadline ('shutdown_timeout' seconds from now);
+        otherwise, or once the deadline passes, they are cancelled and saved
+        as unfinished so resume_session() can pick them up again.
+        """
+        if drain is None:
+            drain = self.config.get('shutdown_mode') == 'drain'
+        if timeout is None:
+            timeout = self.config.get('shutdown_timeout')
+        deadline = time.monotonic() + timeout
         
         with self.lock:
-            for downloader in self.active_downloads.values():
-                downloader.cancel()
+            self.running = False
+            self.work_available.notify_all()
+        self.disk_budget.wake()
         
-        for worker in self.workers:
-            if worker.is_alive():
-                worker.join(timeout=2)
+        if not drain:
+            self._interrupt_active()
+        self._join_workers(deadline)
+        if drain:
+            self._interrupt_active()
+        
+        if self.verify_pool:
+            self.verify_pool.shutdown(wait=False)
+            self.verify_pool = None
+        
+        self.checkpoint()
+        self._finish_profile()
+    
+    def _interrupt_active(self):
+        with self.lock:
+            for task_id, downloader in self.active_downloads.items():
+                self.interrupted.add(task_id)
+                # Keep the partial files: yt-dlp continues them on resume
+                downloader.cancel(keep_partial=True)
+    
+    def _join_workers(self, deadline):
+        with self.lock:
+            workers = list(self.workers)
+        for worker in workers:
+            worker.join(max(0, deadline - time.monotonic()))
+    
+    def checkpoint(self):
+        """Save every task's state so unfinished work survives a restart"""
+        with self.lock:
+            states = [t.checkpoint() for t in self.tasks]
+        try:
+            self.config.save_session(states)
+        except OSError as e:
+            app_log.error(f"Checkpoint error: {e}")
+    
+    def unfinished_session(self):
+        """Checkpointed tasks the last session did not finish"""
+        finished = (DownloadStatus.COMPLETED, DownloadStatus.FAILED, DownloadStatus.CANCELLED)
+        return [state for state in self.config.load_session() if state.get('status') not in finished]
+    
+    def resume_session(self):
+        """Re-queue tasks left unfinished by the last session; returns how many"""
+        states = self.unfinished_session()
+        if not states:
+            return 0
+        
+        verify = []
+        with self.lock:
+            for state in states:
+                task = DownloadTask.from_checkpoint(state)
+                task.log.info("Resumed from the last session", status=state['status'])
+                self.tasks.append(task)
+                # Downloaded but not checked yet: only the verification is left
+                if (state['status'] == DownloadStatus.VERIFYING and task.filepath
+                        and os.path.isfile(task.filepath)):
+                    task.status = DownloadStatus.VERIFYING
+                    verify.append(task)
+                else:
+                    task.filepath = None
+                    self.pending.append(task)
+            self.work_available.notify(len(states) - len(verify))
         
-        self.workers.clear()
+        self._start_profile()
+        self._notify_callback('queue_update')
+        if not self.running:
+            self.start()
+        for task in verify:
+            self._get_verify_pool().submit(self._verify_task, task)
+        return len(states)
+    
+    def _retire(self):
+        """With the lock held: True (and leave the pool) if this worker should exit"""
+        if self.running and len(self.workers) <= self.max_workers:
+            return False
+        current = threading.current_thread()
+        if current in self.workers:
+            self.workers.remove(current)
+        return True
     
     def _worker(self):
         """Worker thread that processes download queue"""
-        while self.running:
-            try:
-                task = self.queue.get(timeout=1)
-            except queue.Empty:
-                continue
-            
-            if not self.running:
-                break
+        while True:
+            with self.work_available:
+                # No timeout: an idle worker only wakes for new work, a resize or stop()
+                while self.running and not self.pending and len(self.workers) <= self.max_workers:
+                    self.work_available.wait()
+                if self._retire():
+                    return
+                task = self.pending.popleft()
             
-            self._download_task(task)
-            self.queue.task_done()
+            if task.status != DownloadStatus.CANCELLED:
+                self._download_task(task)
     
     def _download_task(self, task):
         """Download a single task"""
+        # Already on disk from an earlier run: nothing to download
+        existing = FileIndex.for_path(task.output_path).lookup(task.video_info.get('id'))
+        if existing:
+            task.status = DownloadStatus.COMPLETED
+            task.progress = 100
+            task.filepath = existing
+            task.reused = True
+            task.completed_at = datetime.now()
+            task.log.info("Already downloaded", filepath=existing)
+            self._task_finished(task)
+            return
+        
+        # Same size and duration as a file we already have (e.g. a reupload
+        # on another channel): link that file instead of downloading again
+        if self.config.get('dedupe') and self.config.get('dedupe_skip_similar'):
+            if self._reuse_similar(task):
+                self._task_finished(task)
+                return
+        
+        if not self._reserve_space(task):
+            return
+        
         task.status = DownloadStatus.DOWNLOADING
+        task.error = None
         task.started_at = datetime.now()
+        plan = task.video_info.get('format_plan')
+        task.log.info("Downloading", attempt=task.attempts + 1, format=plan['format'] if plan else None)
         self._notify_callback('task_update', task)
         
+        preallocated = set()
+        
         def progress_callback(d):
             if d['status'] == 'downloading':
                 total = d.get('total_bytes') or d.get('total_bytes_estimate', 0)
                 downloaded = d.get('downloaded_bytes', 0)
                 
+                tmpfile = d.get('tmpfilename')
+                if self.config.get('preallocate') and total and tmpfile and tmpfile not in preallocated:
+                    preallocated.add(tmpfile)
+                    preallocate(tmpfile, total)
+                
                 if total > 0:
                     task.progress = int((downloaded / total) * 100)
                 
                 task.speed = d.get('_speed_str', '')
                 task.eta = d.get('_eta_str', '')
                 self._notify_callback('task_update', task)
+            elif d['status'] == 'finished':
+                task.log.info("Stream downloaded", file=os.path.basename(d.get('filename') or ''),
+                              bytes=d.get('total_bytes') or d.get('downloaded_bytes'),
+                              seconds=round(d.get('elapsed') or 0, 1))
         
         downloader = VideoDownloader(
             self.config,
-            progress_callback=progress_callback
+            progress_callback=progress_callback,
+            log=task.log
         )
         
-        thread_id = threading.get_ident()
         with self.lock:
-            self.active_downloads[thread_id] = downloader
+            self.active_downloads[task.id] = downloader
         
         try:
             result = downloader.download_video(
                 task.video_info['url'],
-                task.output_path
+                task.output_path,
+                task.video_info.get('id'),
+                format_plan=task.video_info.get('format_plan')
             )
             
             if result['status'] == 'success':
                 task.status = DownloadStatus.COMPLETED
                 task.progress = 100
+                task.filepath = result.get('filepath')
+                task.expected_size = result.get('expected_size')
+                task.expected_duration = result.get('duration')
+                if self.config.get('verify_downloads'):
+                    task.status = DownloadStatus.VERIFYING
+                else:
+                    FileIndex.for_path(task.output_path).add(task.video_info.get('id'), task.filepath)
             elif result['status'] == 'cancelled':
                 task.status = DownloadStatus.CANCELLED
+                if task.id in self.interrupted:
+                    # Stopped by shutdown, not by the user: resume it next time
+                    task.status = DownloadStatus.QUEUED
+                    task.progress = 0
+                    task.log.info("Interrupted by shutdown, will resume")
             else:
                 task.status = DownloadStatus.FAILED
                 task.error = result.get('error', 'Unknown error')
@@ -132,25 +360,224 @@ class DownloadManager:
         except Exception as e:
             task.status = DownloadStatus.FAILED
             task.error = str(e)
+            task.log.error(f"Download error: {e}")
         
         finally:
             task.completed_at = datetime.now()
             with self.lock:
-                self.active_downloads.pop(thread_id, None)
+                self.active_downloads.pop(task.id, None)
+            # The file is on disk now, so free space already accounts for it
+            self.disk_budget.release(task.id)
             
+            if task.status == DownloadStatus.VERIFYING:
+                # Verify in a separate pool so this download slot is free again
+                self._notify_callback('task_update', task)
+                self._get_verify_pool().submit(self._verify_task, task)
+            elif task.status == DownloadStatus.QUEUED:
+                self._notify_callback('task_update', task)
+            else:
+                self._task_finished(task)
+    
+    def _reserve_space(self, task):
+        """Hold the task until its estimated size fits on disk; False if cancelled or stopped"""
+        size = self.disk_budget.estimate(task.video_info)
+        if self.disk_budget.try_reserve(task.id, task.output_path, size):
+            return True
+        
+        task.status = DownloadStatus.WAITING
+        task.log.info("Waiting for disk space", reserve_bytes=size)
+        self._notify_callback('task_update', task)
+        
+        def should_stop():
+            return not self.running or task.status == DownloadStatus.CANCELLED
+        
+        if self.disk_budget.reserve(task.id, task.output_path, size, should_stop):
+            return True
+        
+        if task.status == DownloadStatus.WAITING:
+            task.status = DownloadStatus.QUEUED
             self._notify_callback('task_update', task)
-            self._notify_callback('download_complete', task)
+        return False
+    
+    def _get_verify_pool(self):
+        with self.lock:
+            if self.verify_pool is None:
+                self.verify_pool = ThreadPoolExecutor(max_workers=self.config.get('verify_workers'),
+                                                      thread_name_prefix='verify')
+            return self.verify_pool
+    
+    def _verify_task(self, task):
+        """Check a finished file and requeue the task if it is corrupt"""
+        if not self.running:
+            return  # shutting down: stays Verifying in the checkpoint
+        
+        try:
+            error, sha256 = self.verifier.verify(task.filepath, task.expected_size, task.expected_duration)
+        except Exception as e:
+            error, sha256 = f"Verification error: {e}", None
+        
+        index = FileIndex.for_path(task.output_path)
+        video_id = task.video_info.get('id')
+        
+        if error is None:
+            task.status = DownloadStatus.COMPLETED
+            task.log.info("Verified", filepath=task.filepath)
+            # Indexed only now, so an unverified file is never taken as done
+            index.add(video_id, task.filepath, **({'sha256': sha256} if sha256 else {}))
+            self._task_finished(task)
+            return
+        
+        # Drop the bad file so the retry (or the next run) downloads it again
+        index.remove(video_id)
+        try:
+            os.remove(task.filepath)
+        except (OSError, TypeError):
+            pass
+        
+        task.log.warning(f"Verification failed: {error}")
+        task.attempts += 1
+        max_retries = self.config.get('max_retries') if self.config.get('auto_retry') else 0
+        if task.attempts <= max_retries and self.running:
+            self._requeue(task, error)
+        else:
+            task.status = DownloadStatus.FAILED
+            task.error = f"Verification failed: {error}"
+            self._task_finished(task)
+    
+    def _requeue(self, task, error):
+        """Put a task back in the queue after a failed verification"""
+        task.status = DownloadStatus.QUEUED
+        task.progress = 0
+        task.error = error
+        task.filepath = None
+        self._notify_callback('task_update', task)
+        with self.lock:
+            self.pending.append(task)
+            self.work_available.notify()
+    
+    def _reuse_similar(self, task):
+        video_info = task.video_info
+        content_index = ContentIndex.for_path(task.output_path)
+        similar = content_index.find_similar(video_info.get('filesize'), video_info.get('duration'),
+                                             video_info.get('channel'), video_info.get('title'))
+        if not similar:
+            return False
+        
+        layout = OutputLayout(self.config, task.output_path)
+        path = layout.link_existing(similar, video_info, self.config.get('dedupe_link'))
+        if not path:
+            return False
+        
+        content_index.record_skip(path, video_info.get('id'), video_info.get('filesize'),
+                                  video_info.get('duration'), video_info.get('channel'),
+                                  video_info.get('title'))
+        task.log.info("Linked to a matching file instead of downloading", filepath=path, source=similar)
+        task.status = DownloadStatus.COMPLETED
+        task.progress = 100
+        task.filepath = path
+        task.reused = True
+        task.completed_at = datetime.now()
+        return True
+    
+    def _index_content(self, task):
+        """Add a finished download to the content index, linking it if it is a duplicate"""
+        seconds = None
+        if task.started_at and task.completed_at:
+            seconds = (task.completed_at - task.started_at).total_seconds()
+        try:
+            ContentIndex.for_path(task.output_path).add(
+                task.filepath,
+                task.video_info.get('id'),
+                expected_size=task.video_info.get('filesize'),
+                duration=task.video_info.get('duration'),
+                seconds=seconds,
+                link_mode=self.config.get('dedupe_link'),
+                channel=task.video_info.get('channel'),
+                title=task.video_info.get('title'))
+        except OSError as e:
+            task.log.error(f"Content index error: {e}")
+    
+    def _task_finished(self, task):
+        """Called once a task has reached its final state"""
+        if (task.status == DownloadStatus.COMPLETED and task.filepath and not task.reused
+                and self.config.get('dedupe')):
+            self._index_content(task)
+        self._add_to_catalog(task)
+        
+        if task.status == DownloadStatus.FAILED:
+            task.log.info(f"Failed: {task.error}")
+        else:
+            task.log.info(task.status, filepath=task.filepath)
+        
+        self._notify_callback('task_update', task)
+        self._notify_callback('download_complete', task)
+        
+        if self._batch_done():
+            self._finish_profile()
+    
+    def _add_to_catalog(self, task):
+        """Record a completed download in the searchable library catalog"""
+        if task.status != DownloadStatus.COMPLETED or not self.config.get('library_catalog'):
+            return
+        try:
+            LibraryCatalog.shared(self.config).add(task.video_info, task.filepath, task.output_path)
+        except (sqlite3.Error, OSError) as e:
+            task.log.error(f"Library catalog error: {e}")
     
     def cancel_task(self, task):
         """Cancel a specific task"""
+        task.log.info("Cancel requested", status=task.status)
         if task.status == DownloadStatus.QUEUED:
             task.status = DownloadStatus.CANCELLED
             self._notify_callback('task_update', task)
+        elif task.status == DownloadStatus.WAITING:
+            task.status = DownloadStatus.CANCELLED
+            self.disk_budget.wake()
+            self._notify_callback('task_update', task)
         elif task.status == DownloadStatus.DOWNLOADING:
             with self.lock:
-                for downloader in self.active_downloads.values():
+                downloader = self.active_downloads.get(task.id)
+                if downloader:
                     downloader.cancel()
     
+    def get_task(self, task_id):
+        """Look up a task by its id"""
+        with self.lock:
+            for task in self.tasks:
+                if task.id == task_id:
+                    return task
+        return None
+    
+    def snapshot(self):
+        """Stats and task list taken under a single lock acquisition"""
+        with self.lock:
+            revision = self.revision
+            tasks = [t.to_dict() for t in self.tasks]
+            active = len(self.workers)
+        
+        stats = {
+            'total': len(tasks),
+            'completed': 0,
+            'failed': 0,
+            'downloading': 0,
+            'queued': 0,
+            'verifying': 0,
+            'cancelled': 0,
+            'waiting': 0
+        }
+        for t in tasks:
+            key = t['status'].lower()
+            if t['status'] == DownloadStatus.WAITING:
+                # Still pending, just held back until there is disk space
+                stats['waiting'] += 1
+                key = 'queued'
+            if key in stats:
+                stats[key] += 1
+        stats['workers'] = active
+        stats['max_concurrent'] = self.max_workers
+        
+        return revision, stats, tasks
+    
     def get_stats(self):
         """Get download statistics"""
         with self.lock:
@@ -158,16 +585,39 @@ class DownloadManager:
             completed = sum(1 for t in self.tasks if t.status == DownloadStatus.COMPLETED)
             failed = sum(1 for t in self.tasks if t.status == DownloadStatus.FAILED)
             downloading = sum(1 for t in self.tasks if t.status == DownloadStatus.DOWNLOADING)
-            queued = sum(1 for t in self.tasks if t.status == DownloadStatus.QUEUED)
+            waiting = sum(1 for t in self.tasks if t.status == DownloadStatus.WAITING)
+            queued = sum(1 for t in self.tasks if t.status == DownloadStatus.QUEUED) + waiting
+            verifying = sum(1 for t in self.tasks if t.status == DownloadStatus.VERIFYING)
             
             return {
                 'total': total,
                 'completed': completed,
                 'failed': failed,
                 'downloading': downloading,
-                'queued': queued
+                'queued': queued,
+                'verifying': verifying,
+                'waiting': waiting
+            }
+    
+    def known_video_ids(self):
+        """IDs of videos that are queued, downloading or already downloaded"""
+        with self.lock:
+            return {
+                t.video_info.get('id') for t in self.tasks
+                if t.status not in (DownloadStatus.FAILED, DownloadStatus.CANCELLED)
             }
     
+    def prune_finished(self, keep):
+        """Drop the oldest finished tasks so long-running sessions stay bounded"""
+        finished = (DownloadStatus.COMPLETED, DownloadStatus.FAILED, DownloadStatus.CANCELLED)
+        with self.lock:
+            done = [t for t in self.tasks if t.status in finished]
+            if len(done) <= keep:
+                return
+            drop = set(map(id, done[:len(done) - keep]))
+            self.tasks = [t for t in self.tasks if id(t) not in drop]
+        self._notify_callback('queue_update')
+    
     def clear_completed(self):
         """Remove completed tasks from list"""
         with self.lock:
@@ -176,9 +626,40 @@ class DownloadManager:
     
     def _notify_callback(self, event, *args):
         """Notify registered callback"""
+        self.revision = next(self._revisions)
         callback = self.callbacks.get(event)
         if callback:
             try:
                 callback(*args)
             except Exception as e:
-                print(f"Callback error: {e}")
+                app_log.error(f"Callback error: {e}", event=event)
+    
+    # ===== PROFILING =====
+    
+    def _start_profile(self):
+        """Start profiling a batch when 'profile_batches' is on"""
+        with self.lock:
+            if not self.config.get('profile_batches') or self.profiler:
+                return
+            self.profiler = SamplingProfiler(self.config.get('profile_interval'))
+            self.profiler.start()
+        app_log.info("Profiling batch")
+    
+    def _batch_done(self):
+        """True once nothing is queued, downloading or verifying any more"""
+        stats = self.get_stats()
+        return stats['queued'] + stats['downloading'] + stats['verifying'] == 0
+    
+    def _finish_profile(self):
+        """Stop the batch profile and write its report under the config folder"""
+        with self.lock:
+            profiler, self.profiler = self.profiler, None
+        if profiler is None:
+            return
+        profiler.stop()
+        path = self.config.config_dir / 'profiles' / f"batch-{datetime.now():%Y%m%d-%H%M%S}.txt"
+        try:
+            profiler.write_report(str(path))
+            app_log.info(f"Profile report written to {path}")
+        except OSError as e:
+            app_log.error(f"Profile report error: {e}")
@@ -1,23 +1,47 @@
-import yt_dlp
 import os
 from pathlib import Path
+import shutil
 import threading
 import re
+import hashlib
+from output_layout import OutputLayout
+from format_planner import FormatPlanner
+from thumbnail_cache import ThumbnailCache, ThumbnailPlacer
+from request_scheduler import RequestScheduler, ThrottledError, is_throttle
+from task_log import YtDlpLogger
+
+def load_yt_dlp():
+    """Import yt_dlp on first use
+    
+    Importing it loads the whole extractor registry, which is the slowest part
+    of startup, so nothing imports it at module level.
+    """
+    import yt_dlp
+    return yt_dlp
+
+def warm_up():
+    """Import yt_dlp in the background so the first fetch doesn't wait for it"""
+    threading.Thread(target=load_yt_dlp, daemon=True).start()
 
 class DownloadStatus:
     QUEUED = "Queued"
+    WAITING = "Waiting for disk"
     DOWNLOADING = "Downloading"
+    VERIFYING = "Verifying"
     COMPLETED = "Completed"
     FAILED = "Failed"
     CANCELLED = "Cancelled"
 
 class VideoDownloader:
-    def __init__(self, config, progress_callback=None):
+    def __init__(self, config, progress_callback=None, log=None):
         self.config = config
         self.progress_callback = progress_callback
+        # yt-dlp output goes here (the task's log) instead of the console
+        self.log = log
         self.cancel_flag = threading.Event()
+        self.keep_partial = False
         
-    def get_ydl_opts(self, output_path):
+    def get_ydl_opts(self, output_path, format_plan=None):
         quality = self.config.get('quality')
         
         format_string = 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best'
@@ -30,11 +54,18 @@ class VideoDownloader:
         elif quality == 'audio':
             format_string = 'bestaudio[ext=m4a]/bestaudio'
         
+        # Exact format IDs planned from the metadata; the generic string
+        # stays as a fallback in case the format list changed since
+        if format_plan and format_plan.get('quality') == quality:
+            format_string = f"{format_plan['format']}/{format_string}"
+        
         opts = {
             'format': format_string,
-            'outtmpl': os.path.join(output_path, '%(title)s.%(ext)s'),
+            'outtmpl': os.path.join(output_path, self.config.get('filename_template')),
             'progress_hooks': [self._progress_hook],
-            'quiet': False,
+            'logger': YtDlpLogger(self.log),
+            'quiet': True,
+            'noprogress': True,
             'no_warnings': False,
             'extract_flat': False,
             'ignoreerrors': True,
@@ -43,6 +74,8 @@ class VideoDownloader:
         
         if self.config.get('embed_thumbnail'):
             opts['writethumbnail'] = True
+            # Lets the thumbnail placed from the shared cache stand
+            opts['overwrites'] = False
             opts['postprocessors'] = [{
                 'key': 'EmbedThumbnail',
             }, {
@@ -53,7 +86,7 @@ class VideoDownloader:
     
     def _progress_hook(self, d):
         if self.cancel_flag.is_set():
-            raise yt_dlp.utils.DownloadError("Download cancelled by user")
+            raise load_yt_dlp().utils.DownloadError("Download cancelled by user")
         
         if self.progress_callback:
             self.progress_callback(d)
@@ -102,9 +135,7 @@ class VideoDownloader:
         }
         
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(shorts_url, download=False)
-                return info
+            return self._extract(shorts_url, ydl_opts)
         except Exception as e:
             raise Exception(f"Failed to extract shorts info: {str(e)}")
     
@@ -112,47 +143,61 @@ class VideoDownloader:
         """Get list of videos with full metadata from URL"""
         
         # Check if it's a single video
-        if 'watch?v=' in url or '/shorts/' in url:
+        if self.is_single_video_url(url):
             return self._get_single_video_info(url)
         
-        # Otherwise treat as channel/playlist
+        videos = []
+        for entry in self.list_entries(url):
+            video_info = self.resolve_entry(entry)
+            if video_info:
+                videos.append(video_info)
+        
+        return videos
+    
+    def is_single_video_url(self, url):
+        """Check whether a URL points at one video rather than a listing"""
+        return 'watch?v=' in url or '/shorts/' in url
+    
+    def list_entries(self, url):
+        """Enumerate the flat entries of a channel/playlist URL"""
         info = self.extract_shorts_info(url)
         
         if not info:
             raise Exception("No information found for this URL")
         
-        videos = []
+        # Single video
+        if 'entries' not in info:
+            return [self._parse_video_info(info, url)]
         
         # Handle playlists/channels
-        if 'entries' in info:
-            for entry in info['entries']:
-                if entry and entry.get('id'):
-                    # Get full info for each video to get metadata
-                    try:
-                        video_info = self._get_video_metadata(entry.get('id'))
-                        if video_info:
-                            videos.append(video_info)
-                    except:
-                        # Fallback to basic info if full metadata fails
-                        video_url = entry.get('url')
-                        if not video_url:
-                            video_url = f"https://www.youtube.com/watch?v={entry.get('id')}"
-                        
-                        videos.append({
-                            'id': entry.get('id'),
-                            'title': entry.get('title', 'Unknown Title'),
-                            'url': video_url,
-                            'duration': entry.get('duration', 0),
-                            'view_count': entry.get('view_count', 0),
-                            'upload_date': entry.get('upload_date', ''),
-                            'tags': entry.get('tags', []),
-                            'thumbnail': entry.get('thumbnail', '')
-                        })
-        else:
-            # Single video
-            videos.append(self._parse_video_info(info, url))
+        return [entry for entry in info['entries'] if entry and entry.get('id')]
+    
+    def resolve_entry(self, entry):
+        """Get full metadata for a flat entry (None if the video is unavailable)"""
+        # Entries that already went through _parse_video_info need no lookup
+        if 'duration_str' in entry:
+            return entry
         
-        return videos
+        try:
+            return self._get_video_metadata(entry.get('id'))
+        except:
+            pass
+        
+        # Fallback to basic info if full metadata fails
+        video_url = entry.get('url')
+        if not video_url:
+            video_url = f"https://www.youtube.com/watch?v={entry.get('id')}"
+        
+        return {
+            'id': entry.get('id'),
+            'title': entry.get('title', 'Unknown Title'),
+            'url': video_url,
+            'duration': entry.get('duration', 0),
+            'view_count': entry.get('view_count', 0),
+            'upload_date': entry.get('upload_date', ''),
+            'tags': entry.get('tags', []),
+            'thumbnail': entry.get('thumbnail', '')
+        }
     
     def _get_single_video_info(self, url):
         """Get info for a single video"""
@@ -164,9 +209,8 @@ class VideoDownloader:
         }
         
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                return [self._parse_video_info(info, url)]
+            info = self._extract(url, ydl_opts)
+            return [self._parse_video_info(info, url)]
         except Exception as e:
             raise Exception(f"Failed to get video info: {str(e)}")
     
@@ -182,12 +226,24 @@ class VideoDownloader:
         }
         
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                return self._parse_video_info(info, url)
+            info = self._extract(url, ydl_opts)
+            return self._parse_video_info(info, url)
         except:
             return None
     
+    def _extract(self, url, ydl_opts):
+        """Run extract_info(download=False) paced by the shared request scheduler"""
+        def request():
+            log = YtDlpLogger(self.log)
+            with load_yt_dlp().YoutubeDL({**ydl_opts, 'logger': log}) as ydl:
+                info = ydl.extract_info(url, download=False)
+            throttle = next((msg for msg in log.errors if is_throttle(msg)), None)
+            if not info and throttle:
+                raise ThrottledError(throttle)
+            return info
+        
+        return RequestScheduler.shared(self.config).call(url, request)
+    
     def _parse_video_info(self, info, url):
         """Parse video info into standardized format"""
         # Format duration
@@ -215,6 +271,12 @@ class VideoDownloader:
             description = info.get('description', '')
             tags = re.findall(r'#\w+', description)
         
+        # The format table is only in full metadata, not in flat playlist entries
+        format_plan = None
+        if self.config.get('format_planner'):
+            format_plan = FormatPlanner(self.config).plan(info)
+        default_size = self._expected_size(info)
+        
         return {
             'id': info.get('id'),
             'title': info.get('title', 'Unknown Title'),
@@ -225,7 +287,11 @@ class VideoDownloader:
             'view_count_str': view_count_str,
             'upload_date': upload_date,
             'tags': tags[:5] if tags else [],  # Limit to 5 tags
-            'thumbnail': info.get('thumbnail', '')
+            'thumbnail': info.get('thumbnail', ''),
+            'channel': info.get('channel') or info.get('uploader', ''),
+            'filesize': (format_plan or {}).get('filesize') or default_size,
+            'default_filesize': default_size,
+            'format_plan': format_plan
         }
     
     def _format_duration(self, seconds):
@@ -252,32 +318,76 @@ class VideoDownloader:
             return f"{views / 1_000:.1f}K views"
         return f"{views} views"
     
-    def download_video(self, url, output_path):
-        """Download a single video"""
+    def download_video(self, url, output_path, video_id=None, format_plan=None):
+        """Download a single video into its own staging folder, then move it into place"""
         self.cancel_flag.clear()
+        self.keep_partial = False
+        yt_dlp = load_yt_dlp()
+        scheduler = RequestScheduler.shared(self.config)
+        staging = None
         
         try:
-            ydl_opts = self.get_ydl_opts(output_path)
+            # Downloads start with an extraction too, so they respect cooldowns
+            sent_at = scheduler.acquire(url)
+            layout = OutputLayout(self.config, output_path)
+            layout.clean_stale_staging()
+            staging = layout.staging_dir(video_id or hashlib.sha1(url.encode()).hexdigest()[:16])
+            ydl_opts = self.get_ydl_opts(str(staging), format_plan)
             
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                if ydl_opts.get('writethumbnail'):
+                    ydl.add_post_processor(ThumbnailPlacer(ThumbnailCache.shared(self.config)), when='video')
                 info = ydl.extract_info(url, download=True)
                 
+                # ignoreerrors turns a 429 into a logged error instead of a
+                # DownloadError, so the cooldown has to start from the log
+                errors = ydl_opts['logger'].errors
+                if any(is_throttle(msg) for msg in errors):
+                    scheduler.throttled(url, sent_at)
+                
+                if not info and self.cancel_flag.is_set():
+                    return {'status': 'cancelled', 'error': 'Download cancelled'}
                 if not info:
-                    return {'status': 'error', 'error': 'No video information available'}
+                    # ignoreerrors swallowed the reason; it is in the logger
+                    return {'status': 'error', 'error': errors[-1] if errors else 'No video information available'}
                 
-                return {
-                    'status': 'success',
-                    'title': info.get('title', 'Unknown'),
-                    'id': info.get('id', ''),
-                    'filepath': ydl.prepare_filename(info)
-                }
+                downloads = info.get('requested_downloads') or [{}]
+                main_file = downloads[0].get('filepath') or ydl.prepare_filename(info)
+            
+            return {
+                'status': 'success',
+                'title': info.get('title', 'Unknown'),
+                'id': info.get('id', ''),
+                'filepath': layout.finalize(staging, info, main_file),
+                # Only exact sizes: filesize_approx is a bitrate x duration
+                # guess, and a failed check deletes and re-downloads the file
+                'expected_size': self._expected_size(info, exact=True),
+                'duration': info.get('duration')
+            }
         except yt_dlp.utils.DownloadError as e:
             if "cancelled by user" in str(e):
                 return {'status': 'cancelled', 'error': 'Download cancelled'}
             return {'status': 'error', 'error': str(e)}
         except Exception as e:
             return {'status': 'error', 'error': str(e)}
+        finally:
+            # finalize() already emptied it on success; after a cancel or an
+            # error the partial files would otherwise stay in the output folder
+            if staging and not self.keep_partial:
+                shutil.rmtree(staging, ignore_errors=True)
+    
+    def _expected_size(self, info, exact=False):
+        """Announced size of the selected format(s), or None if unknown
+        
+        With exact, estimated sizes (filesize_approx) count as unknown.
+        """
+        formats = info.get('requested_formats') or [info]
+        sizes = [f.get('filesize') or (None if exact else f.get('filesize_approx')) for f in formats]
+        if not all(sizes):
+            return None
+        return sum(sizes)
     
-    def cancel(self):
-        """Cancel current download"""
+    def cancel(self, keep_partial=False):
+        """Cancel current download; keep_partial leaves its staging folder for a resume"""
+        self.keep_partial = keep_partial
         self.cancel_flag.set()
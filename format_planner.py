@@ -0,0 +1,132 @@
+QUALITY_HEIGHTS = {
+    'best': None,
+    '1080p': 1080,
+    '720p': 720,
+    '480p': 480
+}
+
+class FormatPlanner:
+    """Pick the cheapest formats for a video from its metadata format table
+    
+    The resolution stays what the quality setting would give anyway (the
+    highest available up to the limit); within that resolution the planner
+    picks the combination with the fewest bytes, e.g. a lower-bitrate audio
+    track. With the default 'format_preference' of mp4 only mp4/m4a formats
+    are compared whenever they offer that resolution, so the choice is among
+    the mp4 encodings (H.264, or AV1 where YouTube serves it in mp4); VP9 in
+    webm is only considered with another preference or when mp4 does not
+    reach the resolution. A progressive (pre-muxed) format is preferred
+    when it is not much bigger, since it needs no ffmpeg merge.
+    """
+    
+    def __init__(self, config):
+        self.config = config
+    
+    def plan(self, info):
+        """Format plan for an extracted info dict, or None if it has no format table"""
+        formats = [f for f in info.get('formats') or [] if _usable(f)]
+        if not formats:
+            return None
+        
+        quality = self.config.get('quality')
+        duration = info.get('duration')
+        if quality == 'audio':
+            audio = self._pick_audio(formats, duration)
+            if not audio:
+                return None
+            return self._result(quality, [audio], duration, False)
+        
+        limit = QUALITY_HEIGHTS.get(quality)
+        videos = [f for f in formats if f.get('vcodec') != 'none' and f.get('height')
+                  and (limit is None or f['height'] <= limit)]
+        if not videos:
+            return None
+        # Prefer the requested container (mp4/m4a) when it offers the same resolution
+        preferred = self._preferred(videos)
+        height = max(f['height'] for f in videos)
+        if max((f['height'] for f in preferred), default=0) == height:
+            videos = preferred
+        videos = [f for f in videos if f['height'] == height]
+        
+        progressive = [f for f in videos if f.get('acodec') != 'none']
+        adaptive = [f for f in videos if f.get('acodec') == 'none']
+        audio = self._pick_audio(formats, duration)
+        
+        best_progressive = min(progressive, key=lambda f: _size(f, duration), default=None)
+        best_adaptive = None
+        if adaptive and audio:
+            best_adaptive = min(adaptive, key=lambda f: _size(f, duration))
+        
+        if best_progressive and best_adaptive:
+            merged_size = _size(best_adaptive, duration) + _size(audio, duration)
+            slack = 1 + self.config.get('format_progressive_slack')
+            if _size(best_progressive, duration) <= merged_size * slack:
+                return self._result(quality, [best_progressive], duration, True)
+            return self._result(quality, [best_adaptive, audio], duration, False)
+        if best_progressive:
+            return self._result(quality, [best_progressive], duration, True)
+        if best_adaptive:
+            return self._result(quality, [best_adaptive, audio], duration, False)
+        return None
+    
+    def _pick_audio(self, formats, duration):
+        audio = [f for f in formats if f.get('vcodec') == 'none' and f.get('acodec') != 'none']
+        audio = self._preferred(audio, audio=True) or audio
+        if not audio:
+            return None
+        min_abr = self.config.get('format_min_abr')
+        good_enough = [f for f in audio if (f.get('abr') or f.get('tbr') or 0) >= min_abr]
+        if good_enough:
+            return min(good_enough, key=lambda f: _size(f, duration))
+        return max(audio, key=lambda f: f.get('abr') or f.get('tbr') or 0)
+    
+    def _preferred(self, formats, audio=False):
+        if self.config.get('format_preference') != 'mp4':
+            return formats
+        wanted = 'm4a' if audio else 'mp4'
+        return [f for f in formats if f.get('ext') == wanted]
+    
+    def _result(self, quality, chosen, duration, progressive):
+        sizes = [_size(f, duration) for f in chosen]
+        return {
+            'format': '+'.join(f['format_id'] for f in chosen),
+            'filesize': sum(sizes) if all(size != float('inf') for size in sizes) else None,
+            'height': chosen[0].get('height'),
+            'progressive': progressive,
+            'quality': quality
+        }
+
+def _usable(f):
+    return (f.get('format_id') and f.get('ext') != 'mhtml' and not f.get('has_drm')
+            and not (f.get('vcodec') == 'none' and f.get('acodec') == 'none'))
+
+def _size(f, duration):
+    """Announced size, else estimated from the bitrate; unknown sorts last"""
+    size = f.get('filesize') or f.get('filesize_approx')
+    if size:
+        return size
+    if f.get('tbr') and duration:
+        return int(f['tbr'] * 1000 / 8 * duration)
+    return float('inf')
+
+def projected_bytes(videos):
+    """Total planned download size and what the default formats would have cost"""
+    planned = 0
+    baseline = 0
+    unknown = 0
+    for video in videos:
+        plan = video.get('format_plan')
+        size = plan['filesize'] if plan and plan.get('filesize') else video.get('filesize')
+        if not size:
+            unknown += 1
+            continue
+        planned += size
+        baseline += video.get('default_filesize') or size
+    return {'bytes': planned, 'baseline_bytes': baseline, 'unknown': unknown}
+
+def format_bytes(num_bytes):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(num_bytes) < 1024:
+            return f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f} TB"
@@ -2,25 +2,62 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
 import threading
 from config import Config
-from downloader import VideoDownloader, DownloadStatus
+from downloader import DownloadStatus, warm_up
 from download_manager import DownloadManager
+from batch_fetcher import BatchFetcher, SourceStatus
+from output_layout import OutputLayout
+from content_index import ContentIndex
+from request_scheduler import RequestScheduler
+from format_planner import projected_bytes, format_bytes
+from thumbnail_cache import ThumbnailCache, PRIORITY_VISIBLE, PRIORITY_PREFETCH
+from library_catalog import LibraryCatalog
+from task_log import app_log, LEVELS
+from collections import OrderedDict
 from pathlib import Path
+import os
+import subprocess
+import sys
 import traceback
 
 class ModernYTDownloader:
-    def __init__(self, root):
+    def __init__(self, root, profile=False):
         self.root = root
         self.root.title("YouTube Downloader Pro")
         self.root.geometry("1000x750")
         self.root.minsize(900, 650)
         
         self.config = Config()
-        self.download_manager = DownloadManager(self.config)
+        if profile:
+            # For this run only, not saved to the config file
+            self.config.settings['profile_batches'] = True
+        self.thumbnails = ThumbnailCache.shared(self.config)
+        self.show_previews = self.config.get('thumbnail_previews') and self.thumbnails.previews_available()
+        self.thumbnail_photos = OrderedDict()
+        self.thumbnail_requested = {}
+        self.tree_thumbnails = {}
+        self.thumbnail_refresh_pending = False
+        
+        if self.config.get('job_queue_path'):
+            from distributed import CoordinatorManager, open_job_queue
+            self.download_manager = CoordinatorManager(self.config, open_job_queue(self.config))
+        else:
+            self.download_manager = DownloadManager(self.config)
         
         self.download_manager.set_callback('task_update', self.on_task_update)
         self.download_manager.set_callback('queue_update', self.on_queue_update)
         self.download_manager.set_callback('download_complete', self.on_download_complete)
         
+        self.api_server = None
+        if self.config.get('api_enabled'):
+            from api_server import ControlServer
+            self.api_server = ControlServer(self.config, self.download_manager)
+            try:
+                self.api_server.start()
+            except OSError as e:
+                error_msg = f"Could not listen on {self.api_server.host}:{self.api_server.port}:\n\n{e}"
+                self.api_server = None
+                self.root.after(0, lambda: messagebox.showwarning("Control API", error_msg))
+        
         self.setup_styles()
         self.create_widgets()
         
@@ -28,6 +65,15 @@ class ModernYTDownloader:
         
         self.videos_to_download = []
         self.tree_items = {}
+        self.item_tasks = {}
+        self.batch_fetcher = None
+        self.batch_window = None
+        self.source_tree = None
+        self.library_window = None
+        self.source_items = {}
+        self.source_refresh_pending = False
+        
+        self.root.after(200, self.offer_resume)
     
     def setup_styles(self):
         """Clean, readable color scheme - prioritizing functionality"""
@@ -95,6 +141,8 @@ class ModernYTDownloader:
                        fieldbackground=bg_widget,
                        borderwidth=1,
                        font=("Segoe UI", 9))
+        if self.show_previews:
+            style.configure("Treeview", rowheight=self.config.get('thumbnail_preview_size')[1] + 4)
         style.configure("Treeview.Heading",
                        background=accent,
                        foreground="white",
@@ -125,7 +173,7 @@ class ModernYTDownloader:
         url_container = ttk.Frame(input_frame)
         url_container.pack(fill=tk.X, pady=(0, 10))
         
-        ttk.Label(url_container, text="YouTube URL:", style="Section.TLabel").pack(anchor=tk.W, pady=(0, 5))
+        ttk.Label(url_container, text="YouTube URL(s):", style="Section.TLabel").pack(anchor=tk.W, pady=(0, 5))
         
         url_input_frame = ttk.Frame(url_container)
         url_input_frame.pack(fill=tk.X)
@@ -137,6 +185,9 @@ class ModernYTDownloader:
         self.fetch_btn = ttk.Button(url_input_frame, text="Fetch Info", command=self.fetch_info, width=12)
         self.fetch_btn.pack(side=tk.LEFT, padx=(10, 0))
         
+        self.batch_btn = ttk.Button(url_input_frame, text="Batch...", command=self.open_batch_window, width=10)
+        self.batch_btn.pack(side=tk.LEFT, padx=(10, 0))
+        
         # Settings Row
         settings_frame = ttk.Frame(input_frame)
         settings_frame.pack(fill=tk.X, pady=(0, 10))
@@ -170,7 +221,22 @@ class ModernYTDownloader:
                                        font=("Segoe UI", 9))
         concurrent_combo.pack(fill=tk.X, ipady=3)
         concurrent_combo.bind('<<ComboboxSelected>>', 
-                             lambda e: self.config.set('max_concurrent', int(self.concurrent_var.get())))
+                             lambda e: self.download_manager.set_max_concurrent(int(self.concurrent_var.get())))
+        
+        # Folder Layout
+        layout_frame = ttk.Frame(settings_frame)
+        layout_frame.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(10, 0))
+        
+        ttk.Label(layout_frame, text="Folder Layout:").pack(anchor=tk.W, pady=(0, 3))
+        self.layout_var = tk.StringVar(value=self.config.get('output_layout'))
+        layout_combo = ttk.Combobox(layout_frame,
+                                    textvariable=self.layout_var,
+                                    values=list(OutputLayout.LAYOUTS),
+                                    state='readonly',
+                                    width=15,
+                                    font=("Segoe UI", 9))
+        layout_combo.pack(fill=tk.X, ipady=3)
+        layout_combo.bind('<<ComboboxSelected>>', lambda e: self.config.set('output_layout', self.layout_var.get()))
         
         # Save Path
         path_frame = ttk.Frame(input_frame)
@@ -207,7 +273,16 @@ class ModernYTDownloader:
         self.download_selected_btn.pack(side=tk.LEFT, padx=(0, 10))
         
         self.clear_btn = ttk.Button(action_frame, text="Clear Completed", command=self.clear_completed)
-        self.clear_btn.pack(side=tk.LEFT)
+        self.clear_btn.pack(side=tk.LEFT, padx=(0, 10))
+        
+        self.dedupe_btn = ttk.Button(action_frame, text="Dedupe Report", command=self.show_dedupe_report)
+        self.dedupe_btn.pack(side=tk.LEFT, padx=(0, 10))
+        
+        self.library_btn = ttk.Button(action_frame, text="Library...", command=self.open_library_window)
+        self.library_btn.pack(side=tk.LEFT, padx=(0, 10))
+        
+        self.log_btn = ttk.Button(action_frame, text="Log...", command=self.show_selected_log)
+        self.log_btn.pack(side=tk.LEFT)
         
         # ===== STATUS BAR =====
         status_frame = ttk.Frame(main_container)
@@ -239,7 +314,8 @@ class ModernYTDownloader:
         self.tree.heading('status', text='Status')
         self.tree.heading('progress', text='Progress')
         
-        self.tree.column('#0', width=40, stretch=False, anchor=tk.CENTER)
+        preview_width = self.config.get('thumbnail_preview_size')[0] + 40 if self.show_previews else 40
+        self.tree.column('#0', width=preview_width, stretch=False, anchor=tk.CENTER)
         self.tree.column('title', width=300)
         self.tree.column('duration', width=80, stretch=False, anchor=tk.CENTER)
         self.tree.column('views', width=100, stretch=False)
@@ -251,7 +327,14 @@ class ModernYTDownloader:
         # Scrollbars
         vsb = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.tree.yview)
         hsb = ttk.Scrollbar(tree_frame, orient=tk.HORIZONTAL, command=self.tree.xview)
-        self.tree.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
+        
+        def on_scroll(*args):
+            vsb.set(*args)
+            self.schedule_thumbnails()
+        
+        self.tree.configure(yscrollcommand=on_scroll, xscrollcommand=hsb.set)
+        self.tree.bind('<Configure>', lambda e: self.schedule_thumbnails())
+        self.tree.bind('<Double-1>', lambda e: self.show_selected_log())
         
         self.tree.grid(row=0, column=0, sticky=(tk.N, tk.S, tk.E, tk.W))
         vsb.grid(row=0, column=1, sticky=(tk.N, tk.S))
@@ -267,35 +350,187 @@ class ModernYTDownloader:
             self.config.set('download_path', folder)
     
     def fetch_info(self):
-        url = self.url_entry.get().strip()
-        if not url:
+        sources = BatchFetcher.parse_sources(self.url_entry.get())
+        if not sources:
             messagebox.showwarning("Input Required", "Please enter a YouTube URL")
             return
         
+        self.fetch_sources(sources)
+    
+    def fetch_sources(self, sources):
+        """Enumerate one or many sources in the shared fetch pool"""
+        if self.batch_fetcher:
+            return
+        
         self.fetch_btn.config(state='disabled', text="Fetching...")
-        self.status_label.config(text="Fetching video information...")
+        self.batch_btn.config(state='disabled')
+        self.status_label.config(text=f"Fetching video information from {len(sources)} source(s)...")
         self.url_entry.config(state='disabled')
         
+        fetcher = BatchFetcher(self.config, progress_callback=self.on_source_update)
+        self.batch_fetcher = fetcher
+        self.reset_source_tree(sources)
+        known_ids = self.download_manager.known_video_ids()
+        
         def fetch_thread():
             try:
-                downloader = VideoDownloader(self.config)
-                videos = downloader.get_videos_from_url(url)
+                videos = fetcher.fetch(sources, known_ids)
+                # Final per-source rows; queued before the result messages so
+                # the status line ends with the outcome
+                self.root.after(0, lambda: self.refresh_sources(fetcher))
+                failed = [s for s in fetcher.sources if s.status == SourceStatus.FAILED]
                 
-                if not videos:
-                    self.root.after(0, lambda: messagebox.showwarning("No Videos", "No videos found at this URL"))
+                if len(sources) == 1 and failed:
+                    error_msg = failed[0].error
+                    self.root.after(0, lambda: messagebox.showerror("Error", f"Failed to fetch info:\n\n{error_msg}"))
+                    self.root.after(0, lambda: self.status_label.config(text="Error fetching video info"))
+                elif not videos:
+                    self.root.after(0, lambda: messagebox.showwarning("No Videos", "No new videos found at the given URL(s)"))
                 else:
                     self.root.after(0, lambda: self.display_videos(videos))
+                
+                if len(sources) > 1 and failed:
+                    lines = [f"{s.url}: {s.error}" for s in failed[:10]]
+                    if len(failed) > 10:
+                        lines.append(f"...and {len(failed) - 10} more")
+                    summary = "\n".join(lines)
+                    self.root.after(0, lambda: messagebox.showwarning(
+                        "Some Sources Failed", f"{len(failed)} of {len(sources)} source(s) failed:\n\n{summary}"))
                     
             except Exception as e:
                 error_msg = str(e)
+                self.root.after(0, lambda: self.refresh_sources(fetcher))
                 self.root.after(0, lambda: messagebox.showerror("Error", f"Failed to fetch info:\n\n{error_msg}"))
                 self.root.after(0, lambda: self.status_label.config(text="Error fetching video info"))
             finally:
+                self.batch_fetcher = None
                 self.root.after(0, lambda: self.fetch_btn.config(state='normal', text="Fetch Info"))
+                self.root.after(0, lambda: self.batch_btn.config(state='normal'))
                 self.root.after(0, lambda: self.url_entry.config(state='normal'))
         
         threading.Thread(target=fetch_thread, daemon=True).start()
     
+    def on_source_update(self, source):
+        # Lookups report from many pool threads; coalesce them into one UI refresh
+        if self.source_refresh_pending:
+            return
+        self.source_refresh_pending = True
+        self.root.after(100, self.refresh_sources)
+    
+    def refresh_sources(self, fetcher=None):
+        """Show per-source progress; pass the fetcher to refresh after it finished"""
+        self.source_refresh_pending = False
+        fetcher = fetcher or self.batch_fetcher
+        if not fetcher:
+            return
+        
+        finished = (SourceStatus.DONE, SourceStatus.FAILED, SourceStatus.CANCELLED)
+        sources = fetcher.sources
+        done = sum(1 for s in sources if s.status in finished)
+        videos = sum(s.done for s in sources)
+        duplicates = sum(s.duplicates for s in sources)
+        rate = RequestScheduler.shared(self.config).effective_rate()
+        self.status_label.config(
+            text=f"Fetching sources: {done}/{len(sources)} done - {videos} video(s), "
+                 f"{duplicates} duplicate(s) skipped - {rate:.1f} req/s")
+        
+        if self.source_tree and self.source_tree.winfo_exists():
+            for source in sources:
+                item_id = self.source_items.get(source.url)
+                if item_id:
+                    self.source_tree.item(item_id, values=(
+                        source.url,
+                        source.status,
+                        f"{source.done}/{source.total}",
+                        source.duplicates,
+                        source.error or ''
+                    ))
+    
+    def open_batch_window(self):
+        """Dialog for pasting or loading a list of sources"""
+        if self.batch_window and self.batch_window.winfo_exists():
+            self.batch_window.lift()
+            return
+        
+        window = tk.Toplevel(self.root)
+        window.title("Batch Fetch")
+        window.geometry("800x550")
+        self.batch_window = window
+        
+        container = ttk.Frame(window, padding="15")
+        container.pack(fill=tk.BOTH, expand=True)
+        
+        ttk.Label(container, text="Channels, playlists or shorts (one per line, # for comments):",
+                  style="Section.TLabel").pack(anchor=tk.W, pady=(0, 5))
+        
+        sources_text = scrolledtext.ScrolledText(container, height=10, font=("Segoe UI", 9))
+        sources_text.pack(fill=tk.X, pady=(0, 10))
+        
+        button_frame = ttk.Frame(container)
+        button_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        def load_file():
+            path = filedialog.askopenfilename(filetypes=[("Text files", "*.txt"), ("All files", "*.*")])
+            if path:
+                try:
+                    sources = BatchFetcher.load_sources_file(path)
+                except OSError as e:
+                    messagebox.showerror("Error", f"Failed to read file:\n\n{e}", parent=window)
+                    return
+                sources_text.insert(tk.END, "\n".join(sources) + "\n")
+        
+        def fetch_all():
+            sources = BatchFetcher.parse_sources(sources_text.get('1.0', tk.END))
+            if not sources:
+                messagebox.showwarning("Input Required", "Please enter at least one URL", parent=window)
+                return
+            self.fetch_sources(sources)
+        
+        def cancel():
+            if self.batch_fetcher:
+                self.batch_fetcher.cancel()
+        
+        ttk.Button(button_frame, text="Load File...", command=load_file).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(button_frame, text="Fetch All", command=fetch_all, style="Success.TButton").pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(button_frame, text="Cancel Fetch", command=cancel).pack(side=tk.LEFT)
+        
+        tree_frame = ttk.Frame(container)
+        tree_frame.pack(fill=tk.BOTH, expand=True)
+        
+        columns = ('source', 'status', 'videos', 'duplicates', 'error')
+        self.source_tree = ttk.Treeview(tree_frame, columns=columns, show='headings', height=10)
+        self.source_tree.heading('source', text='Source')
+        self.source_tree.heading('status', text='Status')
+        self.source_tree.heading('videos', text='Videos')
+        self.source_tree.heading('duplicates', text='Duplicates')
+        self.source_tree.heading('error', text='Error')
+        
+        self.source_tree.column('source', width=300)
+        self.source_tree.column('status', width=90, stretch=False)
+        self.source_tree.column('videos', width=80, stretch=False, anchor=tk.CENTER)
+        self.source_tree.column('duplicates', width=80, stretch=False, anchor=tk.CENTER)
+        self.source_tree.column('error', width=200)
+        
+        vsb = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.source_tree.yview)
+        self.source_tree.configure(yscrollcommand=vsb.set)
+        self.source_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        vsb.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        if self.batch_fetcher:
+            self.reset_source_tree([s.url for s in self.batch_fetcher.sources])
+            self.refresh_sources()
+    
+    def reset_source_tree(self, sources):
+        self.source_items.clear()
+        if not (self.source_tree and self.source_tree.winfo_exists()):
+            return
+        
+        for item in self.source_tree.get_children():
+            self.source_tree.delete(item)
+        for url in sources:
+            self.source_items[url] = self.source_tree.insert(
+                '', 'end', values=(url, SourceStatus.PENDING, '0/0', 0, ''))
+    
     def display_videos(self, videos):
         self.videos_to_download = videos
         
@@ -303,6 +538,10 @@ class ModernYTDownloader:
         for item in self.tree.get_children():
             self.tree.delete(item)
         self.tree_items.clear()
+        self.thumbnail_photos.clear()
+        self.thumbnail_requested.clear()
+        self.tree_thumbnails.clear()
+        self.item_tasks.clear()
         
         # Add videos to tree with full metadata
         for idx, video in enumerate(videos, 1):
@@ -323,10 +562,12 @@ class ModernYTDownloader:
                                            '0%'
                                        ))
             self.tree_items[video['id']] = item_id
+            self.tree_thumbnails[item_id] = video.get('thumbnail')
         
+        self.schedule_thumbnails()
         self.download_btn.config(state='normal')
         self.download_selected_btn.config(state='normal')
-        self.status_label.config(text=f"Found {len(videos)} video(s) - Ready to download")
+        self.status_label.config(text=f"Found {len(videos)} video(s){self.projection_text(videos)} - Ready to download")
         self.url_entry.delete(0, tk.END)
     
     def download_all(self):
@@ -338,7 +579,8 @@ class ModernYTDownloader:
         
         self.download_btn.config(state='disabled')
         self.download_selected_btn.config(state='disabled')
-        self.status_label.config(text=f"Starting download of {len(self.videos_to_download)} video(s)...")
+        self.status_label.config(text=f"Starting download of {len(self.videos_to_download)} video(s)"
+                                      f"{self.projection_text(self.videos_to_download)}...")
         
         self.download_manager.add_videos(self.videos_to_download, output_path)
         self.videos_to_download = []
@@ -375,7 +617,8 @@ class ModernYTDownloader:
         
         self.download_btn.config(state='disabled')
         self.download_selected_btn.config(state='disabled')
-        self.status_label.config(text=f"Starting download of {len(selected_videos)} selected video(s)...")
+        self.status_label.config(text=f"Starting download of {len(selected_videos)} selected video(s)"
+                                      f"{self.projection_text(selected_videos)}...")
         
         self.download_manager.add_videos(selected_videos, output_path)
         
@@ -384,12 +627,79 @@ class ModernYTDownloader:
             if video in self.videos_to_download:
                 self.videos_to_download.remove(video)
     
+    # ===== THUMBNAIL PREVIEWS =====
+    
+    def schedule_thumbnails(self):
+        # Scrolling fires many events; load thumbnails once it settles
+        if not self.show_previews or self.thumbnail_refresh_pending:
+            return
+        self.thumbnail_refresh_pending = True
+        self.root.after(100, self.load_visible_thumbnails)
+    
+    def load_visible_thumbnails(self):
+        """Request thumbnails for the visible rows first, then the next page"""
+        self.thumbnail_refresh_pending = False
+        children = self.tree.get_children()
+        if not children:
+            return
+        
+        top, bottom = self.tree.yview()
+        start = int(top * len(children))
+        end = min(len(children), int(bottom * len(children)) + 1)
+        visible = children[start:end]
+        upcoming = children[end:end + len(visible)]
+        
+        for priority, items in ((PRIORITY_VISIBLE, visible), (PRIORITY_PREFETCH, upcoming)):
+            for item_id in items:
+                if item_id in self.thumbnail_photos:
+                    self.thumbnail_photos.move_to_end(item_id)  # in view: evict last
+                    continue
+                url = self.tree_thumbnails.get(item_id)
+                if not url:
+                    continue
+                if item_id in self.thumbnail_requested and self.thumbnail_requested[item_id] <= priority:
+                    continue
+                self.thumbnail_requested[item_id] = priority
+                self.thumbnails.request(
+                    url,
+                    lambda url, image, item_id=item_id: self.root.after(0, self.show_thumbnail, item_id, image),
+                    priority)
+    
+    def show_thumbnail(self, item_id, image):
+        if image is None or not self.tree.exists(item_id) or item_id in self.thumbnail_photos:
+            return
+        from PIL import ImageTk
+        
+        photo = ImageTk.PhotoImage(image)
+        self.tree.item(item_id, image=photo)
+        self.thumbnail_photos[item_id] = photo
+        
+        # Rows scrolled far away give their image back; the decoded copy stays
+        # in the cache's LRU, so scrolling back is cheap
+        while len(self.thumbnail_photos) > self.config.get('thumbnail_memory_items'):
+            old_id, _ = self.thumbnail_photos.popitem(last=False)
+            self.thumbnail_requested.pop(old_id, None)
+            if self.tree.exists(old_id):
+                self.tree.item(old_id, image='')
+    
+    def projection_text(self, videos):
+        """Projected download size of a batch for the status bar"""
+        projection = projected_bytes(videos)
+        if not projection['bytes']:
+            return ""
+        text = f" (~{format_bytes(projection['bytes'])}"
+        saved = projection['baseline_bytes'] - projection['bytes']
+        if saved > 0:
+            text += f", {format_bytes(saved)} less than best formats"
+        return text + ")"
+    
     def on_task_update(self, task):
         def update():
             video_id = task.video_info['id']
             item_id = self.tree_items.get(video_id)
             
             if item_id and self.tree.exists(item_id):
+                self.item_tasks[item_id] = task
                 progress_text = f"{task.progress}%"
                 
                 # Get existing values
@@ -433,6 +743,10 @@ class ModernYTDownloader:
             parts.append(f"Downloading: {stats['downloading']}")
         if stats['queued'] > 0:
             parts.append(f"Queued: {stats['queued']}")
+        if stats['waiting'] > 0:
+            parts.append(f"Waiting for disk space: {stats['waiting']}")
+        if stats['verifying'] > 0:
+            parts.append(f"Verifying: {stats['verifying']}")
         if stats['completed'] > 0:
             parts.append(f"Completed: {stats['completed']}")
         if stats['failed'] > 0:
@@ -441,7 +755,7 @@ class ModernYTDownloader:
         text = f"Total: {stats['total']} | " + " | ".join(parts)
         self.stats_label.config(text=text)
         
-        if stats['downloading'] == 0 and stats['queued'] == 0 and stats['total'] > 0:
+        if stats['downloading'] == 0 and stats['queued'] == 0 and stats['verifying'] == 0 and stats['total'] > 0:
             self.status_label.config(text="All downloads completed")
             self.download_btn.config(state='normal')
     
@@ -454,21 +768,211 @@ class ModernYTDownloader:
                 values = self.tree.item(item_id, 'values')
                 if values and values[5] == DownloadStatus.COMPLETED:  # Status is now at index 5
                     self.tree.delete(item_id)
+                    self.thumbnail_photos.pop(item_id, None)
+                    self.item_tasks.pop(item_id, None)
         
         self.update_stats()
     
+    def show_dedupe_report(self):
+        report = ContentIndex.for_path(self.path_var.get()).report()
+        
+        minutes = report['time_saved'] / 60
+        messagebox.showinfo("Dedupe Report",
+                            f"Files indexed: {report['files']}\n"
+                            f"Duplicates replaced by links: {report['linked']} ({format_bytes(report['linked_bytes'])})\n"
+                            f"Downloads skipped: {report['skipped']} ({format_bytes(report['skipped_bytes'])})\n\n"
+                            f"Disk space saved: {format_bytes(report['bytes_saved'])}\n"
+                            f"Download time saved: ~{minutes:.1f} min")
+    
+    def open_library_window(self):
+        """Search box over everything downloaded so far"""
+        if self.library_window and self.library_window.winfo_exists():
+            self.library_window.lift()
+            return
+        
+        catalog = LibraryCatalog.shared(self.config)
+        window = tk.Toplevel(self.root)
+        window.title("Library")
+        window.geometry("900x550")
+        self.library_window = window
+        
+        container = ttk.Frame(window, padding="15")
+        container.pack(fill=tk.BOTH, expand=True)
+        
+        ttk.Label(container, text="Search (words, #tag, channel:name, views>1M, duration<30, after:2025-01-31, last:30d):",
+                  style="Section.TLabel").pack(anchor=tk.W, pady=(0, 5))
+        
+        search_frame = ttk.Frame(container)
+        search_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        query_var = tk.StringVar()
+        entry = ttk.Entry(search_frame, textvariable=query_var, font=("Segoe UI", 10))
+        entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 10))
+        
+        order_var = tk.StringVar(value='newest')
+        order_combo = ttk.Combobox(search_frame, textvariable=order_var, state='readonly', width=12,
+                                   values=['newest', 'oldest', 'views', 'duration', 'downloaded'])
+        order_combo.pack(side=tk.LEFT)
+        
+        tree_frame = ttk.Frame(container)
+        tree_frame.pack(fill=tk.BOTH, expand=True)
+        
+        columns = ('title', 'channel', 'views', 'date', 'duration', 'tags')
+        tree = ttk.Treeview(tree_frame, columns=columns, show='headings')
+        for column, heading, width in (('title', 'Title', 300), ('channel', 'Channel', 140),
+                                       ('views', 'Views', 90), ('date', 'Uploaded', 90),
+                                       ('duration', 'Duration', 70), ('tags', 'Tags', 160)):
+            tree.heading(column, text=heading)
+            tree.column(column, width=width, stretch=column in ('title', 'tags'))
+        
+        vsb = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscrollcommand=vsb.set)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        vsb.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        result_label = ttk.Label(container, text="", style="Status.TLabel")
+        result_label.pack(anchor=tk.W, pady=(10, 0))
+        
+        paths = {}
+        pending = [None]
+        
+        def run_search():
+            pending[0] = None
+            try:
+                results = catalog.query(query_var.get(), order_var.get(), self.config.get('library_search_limit'))
+            except Exception as e:
+                result_label.config(text=f"Search error: {e}")
+                return
+            tree.delete(*tree.get_children())
+            paths.clear()
+            for video in results:
+                duration = video['duration'] or 0
+                item_id = tree.insert('', tk.END, values=(
+                    video['title'],
+                    video['channel'],
+                    f"{video['view_count']:,}" if video['view_count'] is not None else '',
+                    video['upload_date'] or '',
+                    f"{int(duration // 60)}:{int(duration % 60):02d}",
+                    video['tags']
+                ))
+                paths[item_id] = video['filepath']
+            result_label.config(text=f"{len(results)} result(s) - double-click to open")
+        
+        def schedule_search(*args):
+            # Search as the user types, but not on every keystroke
+            if pending[0]:
+                window.after_cancel(pending[0])
+            pending[0] = window.after(150, run_search)
+        
+        def open_selected(event):
+            item_id = tree.identify_row(event.y)
+            path = paths.get(item_id)
+            if not path or not os.path.exists(path):
+                messagebox.showwarning("Library", "The file is no longer on disk.", parent=window)
+                return
+            self.open_file(path)
+        
+        query_var.trace_add('write', schedule_search)
+        order_combo.bind('<<ComboboxSelected>>', schedule_search)
+        tree.bind('<Double-1>', open_selected)
+        entry.focus_set()
+        run_search()
+    
+    @staticmethod
+    def open_file(path):
+        if sys.platform == 'win32':
+            os.startfile(path)
+        else:
+            subprocess.Popen(['open' if sys.platform == 'darwin' else 'xdg-open', path])
+    
+    def show_selected_log(self):
+        """Log of the selected video's download, or the application log"""
+        selection = self.tree.selection()
+        task = self.item_tasks.get(selection[0]) if selection else None
+        if task:
+            self.open_log_window(task.log, f"Log - {task.video_info.get('title', '')[:60]}")
+        else:
+            self.open_log_window(app_log, "Application Log")
+    
+    def open_log_window(self, log, title):
+        window = tk.Toplevel(self.root)
+        window.title(title)
+        window.geometry("850x450")
+        
+        container = ttk.Frame(window, padding="15")
+        container.pack(fill=tk.BOTH, expand=True)
+        
+        top_frame = ttk.Frame(container)
+        top_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        ttk.Label(top_frame, text="Level:").pack(side=tk.LEFT, padx=(0, 5))
+        level_var = tk.StringVar(value='info')
+        level_combo = ttk.Combobox(top_frame, textvariable=level_var, state='readonly', width=10,
+                                   values=[level for level in LEVELS if level != 'off'])
+        level_combo.pack(side=tk.LEFT)
+        
+        text = scrolledtext.ScrolledText(container, font=("Consolas", 9), wrap=tk.NONE)
+        text.pack(fill=tk.BOTH, expand=True)
+        
+        shown = [None]
+        
+        def redraw():
+            shown[0] = log.records[-1] if log.records else None
+            at_end = text.yview()[1] >= 0.999
+            text.config(state='normal')
+            text.delete('1.0', tk.END)
+            text.insert(tk.END, log.text(level_var.get()))
+            text.config(state='disabled')
+            if at_end:
+                text.see(tk.END)
+        
+        def poll():
+            if not window.winfo_exists():
+                return
+            # Only redraw when something was logged since the last look
+            if (log.records[-1] if log.records else None) is not shown[0]:
+                redraw()
+            window.after(1000, poll)
+        
+        level_combo.bind('<<ComboboxSelected>>', lambda e: redraw())
+        redraw()
+        window.after(1000, poll)
+    
+    def offer_resume(self):
+        """Offer to continue downloads that were unfinished when the app last closed"""
+        if hasattr(self.download_manager, 'job_queue'):
+            return  # distributed jobs are kept by the shared queue
+        unfinished = self.download_manager.unfinished_session()
+        if not unfinished:
+            return
+        if not messagebox.askyesno("Resume Downloads",
+                                   f"{len(unfinished)} download(s) were not finished last time. Resume them?"):
+            self.config.save_session([])
+            return
+        
+        self.display_videos([state['video_info'] for state in unfinished])
+        self.videos_to_download = []
+        self.download_btn.config(state='disabled')
+        self.download_selected_btn.config(state='disabled')
+        count = self.download_manager.resume_session()
+        self.status_label.config(text=f"Resuming {count} download(s)...")
+    
     def on_closing(self):
         stats = self.download_manager.get_stats()
-        if stats['downloading'] > 0 or stats['queued'] > 0:
+        if stats['downloading'] > 0 or stats['queued'] > 0 or stats['verifying'] > 0:
             if not messagebox.askokcancel("Quit", "Downloads in progress. Stop all downloads and quit?"):
                 return
         
+        if self.api_server:
+            self.api_server.stop()
         self.download_manager.stop()
         self.root.destroy()
 
-def main():
+def main(profile=False):
     root = tk.Tk()
-    app = ModernYTDownloader(root)
+    app = ModernYTDownloader(root, profile)
+    # Let the window paint before yt_dlp starts loading in the background
+    root.after_idle(lambda: root.after(50, warm_up))
     root.mainloop()
 
 if __name__ == "__main__":
@@ -0,0 +1,220 @@
+import re
+import sqlite3
+import threading
+import time
+from datetime import date, timedelta
+
+ORDERS = {
+    'newest': 'v.upload_date DESC',
+    'oldest': 'v.upload_date ASC',
+    'views': 'v.view_count DESC',
+    'duration': 'v.duration DESC',
+    'downloaded': 'v.downloaded_at DESC'
+}
+
+COLUMNS = ('video_id', 'title', 'channel', 'url', 'filepath', 'duration', 'view_count',
+           'upload_date', 'tags', 'filesize', 'downloaded_at')
+
+class LibraryCatalog:
+    """Searchable catalog of downloaded shorts, kept in a local SQLite file
+    
+    Every completed download is recorded with the metadata fetched for it.
+    Titles, tags and channel names go into an FTS5 index; views, duration,
+    upload date and download time are plain indexed columns, so searches
+    like "#cooking views>1M last:30d" are answered locally in milliseconds.
+    """
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS videos (
+            id INTEGER PRIMARY KEY,
+            video_id TEXT NOT NULL UNIQUE,
+            title TEXT NOT NULL DEFAULT '',
+            channel TEXT NOT NULL DEFAULT '',
+            url TEXT,
+            filepath TEXT,
+            output_path TEXT,
+            duration REAL,
+            view_count INTEGER,
+            upload_date TEXT,
+            tags TEXT NOT NULL DEFAULT '',
+            filesize INTEGER,
+            downloaded_at REAL
+        );
+        CREATE INDEX IF NOT EXISTS videos_upload_date ON videos (upload_date);
+        CREATE INDEX IF NOT EXISTS videos_view_count ON videos (view_count);
+        CREATE INDEX IF NOT EXISTS videos_duration ON videos (duration);
+        CREATE INDEX IF NOT EXISTS videos_downloaded_at ON videos (downloaded_at);
+        CREATE INDEX IF NOT EXISTS videos_channel ON videos (channel COLLATE NOCASE);
+    """
+    
+    # External-content FTS table kept in sync by triggers; the prefix indexes
+    # keep search-as-you-type (every word is a prefix query) fast
+    FTS_SCHEMA = """
+        CREATE VIRTUAL TABLE IF NOT EXISTS videos_fts USING fts5(
+            title, tags, channel, content='videos', content_rowid='id', prefix='2 3');
+        CREATE TRIGGER IF NOT EXISTS videos_ai AFTER INSERT ON videos BEGIN
+            INSERT INTO videos_fts (rowid, title, tags, channel)
+            VALUES (new.id, new.title, new.tags, new.channel);
+        END;
+        CREATE TRIGGER IF NOT EXISTS videos_ad AFTER DELETE ON videos BEGIN
+            INSERT INTO videos_fts (videos_fts, rowid, title, tags, channel)
+            VALUES ('delete', old.id, old.title, old.tags, old.channel);
+        END;
+        CREATE TRIGGER IF NOT EXISTS videos_au AFTER UPDATE ON videos BEGIN
+            INSERT INTO videos_fts (videos_fts, rowid, title, tags, channel)
+            VALUES ('delete', old.id, old.title, old.tags, old.channel);
+            INSERT INTO videos_fts (rowid, title, tags, channel)
+            VALUES (new.id, new.title, new.tags, new.channel);
+        END;
+    """
+    
+    _shared = None
+    _shared_lock = threading.Lock()
+    
+    def __init__(self, path):
+        self.path = str(path)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(self.SCHEMA)
+        try:
+            self.conn.executescript(self.FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5: fall back to LIKE matching
+            self.fts = False
+    
+    @classmethod
+    def shared(cls, config):
+        """One catalog per process, stored next to the config"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                config.config_dir.mkdir(exist_ok=True)
+                cls._shared = cls(config.config_dir / 'library.db')
+            return cls._shared
+    
+    def close(self):
+        with self.lock:
+            self.conn.close()
+    
+    def add(self, video_info, filepath, output_path=None):
+        """Record (or refresh) a downloaded video"""
+        tags = ' '.join(str(t).lstrip('#') for t in video_info.get('tags') or [])
+        row = (
+            video_info.get('id'),
+            video_info.get('title') or '',
+            video_info.get('channel') or '',
+            video_info.get('url'),
+            filepath,
+            output_path,
+            video_info.get('duration'),
+            video_info.get('view_count'),
+            video_info.get('upload_date') or None,
+            tags,
+            video_info.get('filesize'),
+            time.time()
+        )
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO videos (video_id, title, channel, url, filepath, output_path, duration, "
+                "view_count, upload_date, tags, filesize, downloaded_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (video_id) DO UPDATE SET title = excluded.title, channel = excluded.channel, "
+                "url = excluded.url, filepath = excluded.filepath, output_path = excluded.output_path, "
+                "duration = excluded.duration, view_count = excluded.view_count, "
+                "upload_date = excluded.upload_date, tags = excluded.tags, filesize = excluded.filesize, "
+                "downloaded_at = excluded.downloaded_at", row)
+    
+    def remove(self, video_id):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM videos WHERE video_id = ?", (video_id,))
+    
+    def count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM videos").fetchone()[0]
+    
+    def search(self, text=None, tags=(), channel=None, min_views=None, max_views=None,
+               after=None, before=None, min_duration=None, max_duration=None,
+               order='newest', limit=100):
+        """Videos matching all given filters; dates are 'YYYY-MM-DD' strings"""
+        where = []
+        params = []
+        join = ""
+        
+        words = _words(text)
+        # Tags go through _words() too; each becomes a phrase in the tags column
+        tags = [' '.join(_words(t)) for t in tags]
+        tags = [t for t in tags if t]
+        if self.fts and (words or tags):
+            terms = [f'"{w}"*' for w in words] + [f'tags : "{t}"' for t in tags]
+            join = "JOIN videos_fts f ON f.rowid = v.id"
+            where.append("videos_fts MATCH ?")
+            params.append(' AND '.join(terms))
+        else:
+            for word in words:
+                where.append("(v.title LIKE ? OR v.tags LIKE ? OR v.channel LIKE ?)")
+                params += [f"%{word}%"] * 3
+            for tag in tags:
+                where.append("(' ' || v.tags || ' ') LIKE ?")
+                params.append(f"% {tag} %")
+        
+        for column, op, value in (('channel', '=', channel),
+                                  ('view_count', '>=', min_views), ('view_count', '<=', max_views),
+                                  ('upload_date', '>=', after), ('upload_date', '<=', before),
+                                  ('duration', '>=', min_duration), ('duration', '<=', max_duration)):
+            if value is None:
+                continue
+            collate = " COLLATE NOCASE" if column == 'channel' else ""
+            where.append(f"v.{column}{collate} {op} ?")
+            params.append(value)
+        
+        sql = f"SELECT {', '.join('v.' + c for c in COLUMNS)} FROM videos v {join}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {ORDERS.get(order, ORDERS['newest'])} LIMIT ?"
+        params.append(int(limit))
+        
+        with self.lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [dict(zip(COLUMNS, row)) for row in rows]
+    
+    def query(self, query, order='newest', limit=100):
+        """Search with the search box syntax (see parse_query)"""
+        return self.search(order=order, limit=limit, **parse_query(query))
+
+def _words(text):
+    # Keep letters/digits only so user input can never break FTS syntax
+    return re.findall(r'\w+', text or '')
+
+def parse_query(query):
+    """Turn search box text into search() filters
+    
+    Plain words match title, tags and channel. Besides those:
+    #tag, channel:name, views>1M / views<10K, duration<30 / duration>60
+    (seconds), after:2025-01-31 / before:2025-12-31, last:30d (uploaded
+    in the last 30 days).
+    """
+    filters = {'tags': []}
+    words = []
+    for token in (query or '').split():
+        lower = token.lower()
+        match = re.fullmatch(r'(views|duration)([<>])=?([\d.]+)([km]?)', lower)
+        if token.startswith('#') and len(token) > 1:
+            filters['tags'].append(token[1:])
+        elif lower.startswith('channel:') and len(token) > 8:
+            filters['channel'] = token[8:]
+        elif match:
+            field, op, number, suffix = match.groups()
+            value = float(number) * {'': 1, 'k': 1_000, 'm': 1_000_000}[suffix]
+            bound = 'min' if op == '>' else 'max'
+            filters[f"{bound}_{'views' if field == 'views' else 'duration'}"] = value
+        elif re.fullmatch(r'(after|before):\d{4}-\d{2}-\d{2}', lower):
+            key, value = lower.split(':')
+            filters[key] = value
+        elif re.fullmatch(r'last:\d+d', lower):
+            days = int(lower[5:-1])
+            filters['after'] = (date.today() - timedelta(days=days)).isoformat()
+        else:
+            words.append(token)
+    filters['text'] = ' '.join(words)
+    return filters
@@ -0,0 +1,225 @@
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from pathlib import Path
+
+STAGING_DIR = '.staging'
+INDEX_FILE = '.index.jsonl'
+COMPACT_MIN_LINES = 1000
+PARTIAL_SUFFIXES = ('.part', '.ytdl', '.temp', '.tmp')
+
+class FileIndex:
+    """Append-only video ID -> file index for one download folder
+    
+    Answers "is this video already on disk?" with one dict lookup and one
+    stat instead of scanning a folder that may hold 100k files. Removals and
+    re-adds only append, so the file is compacted on load once most of its
+    lines are superseded.
+    """
+    
+    _instances = {}
+    _instances_lock = threading.Lock()
+    
+    def __init__(self, root):
+        self.root = Path(root)
+        self.index_file = self.root / INDEX_FILE
+        self.lock = threading.Lock()
+        self.entries = None
+    
+    @classmethod
+    def for_path(cls, root):
+        """Shared index instance per download folder"""
+        key = os.path.abspath(root)
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(key)
+            return cls._instances[key]
+    
+    def _load(self):
+        self.entries = {}
+        if not self.index_file.exists():
+            return
+        records = {}
+        lines = 0
+        with open(self.index_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                lines += 1
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # torn last line from a crash
+                if record.get('path'):
+                    self.entries[record['id']] = record['path']
+                    records[record['id']] = record
+                else:
+                    self.entries.pop(record['id'], None)
+                    records.pop(record['id'], None)
+            size = f.tell()
+        
+        if lines >= COMPACT_MIN_LINES and lines > 2 * len(records):
+            self._compact(records.values(), size)
+    
+    def _compact(self, records, size):
+        temp = self.index_file.with_name(INDEX_FILE + '.tmp')
+        try:
+            with open(temp, 'w', encoding='utf-8') as f:
+                for record in records:
+                    f.write(json.dumps(record) + '\n')
+            # Another process sharing the folder appended meanwhile: keep its lines
+            if self.index_file.stat().st_size == size:
+                os.replace(temp, self.index_file)
+        except OSError:
+            pass
+        finally:
+            if temp.exists():
+                try:
+                    os.remove(temp)
+                except OSError:
+                    pass
+    
+    def lookup(self, video_id):
+        """Absolute path of the video's file if it is still on disk, else None"""
+        with self.lock:
+            if self.entries is None:
+                self._load()
+            relpath = self.entries.get(video_id)
+        if relpath is None:
+            return None
+        
+        path = self.root / relpath
+        if path.exists():
+            return str(path)
+        self.remove(video_id)
+        return None
+    
+    def add(self, video_id, path, **details):
+        """Record a file; extra details (e.g. sha256) are kept in the index file"""
+        relpath = os.path.relpath(path, self.root)
+        self._append(video_id, relpath, details)
+    
+    def remove(self, video_id):
+        self._append(video_id, None)
+    
+    def _append(self, video_id, relpath, details=None):
+        with self.lock:
+            if self.entries is None:
+                self._load()
+            if relpath is None:
+                self.entries.pop(video_id, None)
+            else:
+                self.entries[video_id] = relpath
+            self.root.mkdir(parents=True, exist_ok=True)
+            with open(self.index_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'id': video_id, 'path': relpath, **(details or {})}) + '\n')
+
+class OutputLayout:
+    """Where a download is staged and where it finally lands
+    
+    Every task downloads into its own staging folder (keyed by video ID) under
+    the output folder, so concurrent workers never write to the same name.
+    Finished files are then moved into the configured layout with os.replace,
+    which is atomic because staging is on the same filesystem.
+    """
+    
+    LAYOUTS = ('flat', 'id_prefix', 'channel_date')
+    
+    _cleaned = set()
+    _cleaned_lock = threading.Lock()
+    
+    def __init__(self, config, output_path):
+        self.config = config
+        self.output_path = Path(output_path)
+        self.layout = config.get('output_layout')
+        if self.layout not in self.LAYOUTS:
+            self.layout = 'flat'
+        self.index = FileIndex.for_path(output_path)
+    
+    def clean_stale_staging(self):
+        """Remove staging folders nothing has written to for 'staging_max_age' seconds
+        
+        Left behind by crashes, or by interrupted downloads that were never
+        resumed. Runs once per output folder and process.
+        """
+        key = os.path.abspath(self.output_path)
+        with self._cleaned_lock:
+            if key in self._cleaned:
+                return
+            self._cleaned.add(key)
+        
+        staging_root = self.output_path / STAGING_DIR
+        if not staging_root.is_dir():
+            return
+        cutoff = time.time() - self.config.get('staging_max_age')
+        for entry in staging_root.iterdir():
+            try:
+                # .part files are written continuously while a download runs
+                newest = max([entry.stat().st_mtime] + [p.stat().st_mtime for p in entry.iterdir()])
+            except OSError:
+                continue
+            if newest < cutoff:
+                shutil.rmtree(entry, ignore_errors=True)
+    
+    def staging_dir(self, video_id):
+        path = self.output_path / STAGING_DIR / _safe_name(video_id)
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+    
+    def target_dir(self, info):
+        if self.layout == 'id_prefix':
+            return self.output_path / _safe_name(info.get('id', '_'))[:2]
+        
+        if self.layout == 'channel_date':
+            channel = info.get('channel') or info.get('uploader') or info.get('uploader_id') or 'Unknown'
+            upload_date = (info.get('upload_date') or '').replace('-', '')
+            month = f"{upload_date[:4]}-{upload_date[4:6]}" if len(upload_date) >= 6 else 'unknown-date'
+            return self.output_path / _safe_name(channel) / month
+        
+        return self.output_path
+    
+    def finalize(self, staging, info, main_file):
+        """Move finished files out of staging; returns the main file's final path"""
+        target = self.target_dir(info)
+        target.mkdir(parents=True, exist_ok=True)
+        
+        final_path = None
+        moved = []
+        for entry in Path(staging).iterdir():
+            if not entry.is_file() or entry.name.endswith(PARTIAL_SUFFIXES):
+                continue
+            destination = target / entry.name
+            os.replace(entry, destination)
+            moved.append(destination)
+            if main_file and entry.name == os.path.basename(main_file):
+                final_path = destination
+        
+        if not moved:
+            raise Exception("Download finished but no output file was found")
+        if final_path is None:
+            # Postprocessors may have renamed the file; the media file is the largest
+            final_path = max(moved, key=lambda p: p.stat().st_size)
+        
+        shutil.rmtree(staging, ignore_errors=True)
+        # Not indexed yet: the caller does that once the file passed verification
+        return str(final_path)
+    
+    def link_existing(self, source, video_info, link_mode='auto'):
+        """Place a link to an identical file instead of downloading; None if linking fails"""
+        from content_index import link_file
+        
+        target = self.target_dir(video_info)
+        target.mkdir(parents=True, exist_ok=True)
+        name = f"{video_info.get('title', 'Unknown Title')[:80]} [{video_info.get('id')}]"
+        destination = target / (_safe_name(name) + Path(source).suffix)
+        
+        if not link_file(source, destination, link_mode):
+            return None
+        self.index.add(video_info.get('id'), destination)
+        return str(destination)
+
+def _safe_name(name):
+    """Make a string safe to use as one path component"""
+    name = re.sub(r'[\\/:*?"<>|\x00-\x1f]', '_', str(name)).strip(' .')
+    return name[:100] or '_'
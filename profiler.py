@@ -0,0 +1,128 @@
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+# Leaf frames in these files mean the thread is blocked waiting, not working
+IDLE_FILES = {'threading.py', 'queue.py', 'selectors.py'}
+# ... and so do these functions (Tk's event loop waits for events in C)
+IDLE_FUNCTIONS = {'mainloop'}
+
+class SamplingProfiler:
+    """Statistical profiler for every thread of the process
+    
+    A background thread records the Python stack of each thread every
+    'interval' seconds. Unlike cProfile, which only sees the thread that
+    enabled it, this covers the GUI, download workers, verifiers and fetchers
+    at once, including threads that were already running, and its cost does
+    not depend on how many function calls the code makes.
+    """
+    
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.started_at = None
+        self.elapsed = 0.0
+        self.samples = 0
+        # Per thread group: samples, idle samples, self and inclusive counts
+        self.groups = {}
+    
+    @property
+    def running(self):
+        return self.thread is not None
+    
+    def start(self):
+        if self.thread:
+            return
+        self.stop_event.clear()
+        self.started_at = time.monotonic()
+        self.thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        if not self.thread:
+            return
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+        self.elapsed += time.monotonic() - self.started_at
+    
+    def _run(self):
+        own = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    self._sample(_group(names.get(ident, '?')), frame)
+            self.samples += 1
+    
+    def _sample(self, group, frame):
+        stats = self.groups.get(group)
+        if stats is None:
+            stats = self.groups[group] = {'samples': 0, 'idle': 0, 'self': Counter(), 'total': Counter()}
+        stats['samples'] += 1
+        code = frame.f_code
+        if os.path.basename(code.co_filename) in IDLE_FILES or code.co_name in IDLE_FUNCTIONS:
+            stats['idle'] += 1
+            return
+        
+        stats['self'][_key(frame.f_code)] += 1
+        seen = set()
+        while frame is not None:
+            key = _key(frame.f_code)
+            if key not in seen:  # recursion counts once per sample
+                seen.add(key)
+                stats['total'][key] += 1
+            frame = frame.f_back
+    
+    def report(self, top=15):
+        """Plain text report of the hottest functions, per thread group and overall"""
+        lines = [f"Profile: {self.elapsed:.1f} s, {self.samples} samples every "
+                 f"{self.interval * 1000:g} ms"]
+        
+        overall = {'samples': 0, 'idle': 0, 'self': Counter(), 'total': Counter()}
+        for stats in self.groups.values():
+            for field in ('samples', 'idle'):
+                overall[field] += stats[field]
+            overall['self'].update(stats['self'])
+            overall['total'].update(stats['total'])
+        
+        sections = [('all threads', overall)]
+        sections += sorted(self.groups.items(), key=lambda item: item[1]['samples'] - item[1]['idle'],
+                           reverse=True)
+        for name, stats in sections:
+            busy = stats['samples'] - stats['idle']
+            lines.append("")
+            lines.append(f"== {name}: {busy} busy samples, {stats['idle']} idle ==")
+            if not busy:
+                continue
+            for title, counts in (('self', stats['self']), ('inclusive', stats['total'])):
+                lines.append(f"  by {title} time:")
+                lines.append("     self%  incl%  function")
+                for key, count in counts.most_common(top):
+                    lines.append(f"    {stats['self'][key] * 100 / busy:6.1f} "
+                                 f"{stats['total'][key] * 100 / busy:6.1f}  {_describe(key)}")
+        return '\n'.join(lines) + '\n'
+    
+    def write_report(self, path, top=15):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.report(top))
+        return path
+
+def _group(name):
+    # "download-3", "verify_1", "Thread-7 (_worker)" -> one line per kind of thread
+    unnamed = re.fullmatch(r'Thread-\d+ \((.+)\)', name)
+    if unnamed:
+        return unnamed.group(1)
+    return re.sub(r'[-_ ]?\d+$', '', name) or name
+
+def _key(code):
+    return (code.co_filename, code.co_firstlineno, code.co_name)
+
+def _describe(key):
+    filename, line, name = key
+    return f"{os.path.basename(filename)}:{line} {name}"
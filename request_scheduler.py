@@ -0,0 +1,170 @@
+import re
+import threading
+import time
+from collections import deque
+from urllib.parse import urlparse
+
+# Messages yt-dlp reports when YouTube is throttling us or wants a human
+THROTTLE_PATTERNS = re.compile(
+    r"HTTP Error 429|Too Many Requests|confirm you.re not a bot|unusual traffic|"
+    r"consent\.youtube\.com|captcha|rate.?limit",
+    re.IGNORECASE)
+
+RATE_WINDOW = 60
+
+class ThrottledError(Exception):
+    """The server answered with a 429, a bot check or a consent page"""
+
+def is_throttle(message):
+    return bool(THROTTLE_PATTERNS.search(str(message)))
+
+class HostBucket:
+    """Token bucket and adaptive rate for one host"""
+    
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.refilled_at = time.monotonic()
+        self.cooldown_until = 0.0
+        self.last_throttle = 0.0
+        self.ceiling = None
+        self.strikes = 0
+        self.throttles = 0
+        self.completed = deque()
+    
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+
+class RequestScheduler:
+    """Paces extraction requests per host and backs off when throttled
+    
+    Every metadata lookup takes a token from its host's bucket first. The
+    bucket's rate adapts: it creeps up while requests succeed and halves on a
+    429 or bot check, which also starts a cooldown window that every thread
+    waits out. The rate that triggered the last throttle is remembered as a
+    ceiling and approached much more slowly, so the scheduler settles just
+    below what the server tolerates instead of oscillating around it.
+    """
+    
+    _shared = None
+    _shared_lock = threading.Lock()
+    
+    def __init__(self, config):
+        self.config = config
+        self.lock = threading.Lock()
+        self.hosts = {}
+    
+    @classmethod
+    def shared(cls, config):
+        """One scheduler per process, so all fetchers and workers share the limits"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(config)
+            return cls._shared
+    
+    def _bucket(self, host):
+        bucket = self.hosts.get(host)
+        if bucket is None:
+            bucket = HostBucket(self.config.get('rate_limit_rps'), self.config.get('rate_limit_burst'))
+            self.hosts[host] = bucket
+        return bucket
+    
+    def acquire(self, url):
+        """Block until a request to url's host may be sent; returns the send time"""
+        host = _host(url)
+        while True:
+            with self.lock:
+                bucket = self._bucket(host)
+                now = time.monotonic()
+                if now < bucket.cooldown_until:
+                    wait = bucket.cooldown_until - now
+                else:
+                    bucket.refill(now)
+                    if bucket.tokens >= 1:
+                        bucket.tokens -= 1
+                        return now
+                    wait = (1 - bucket.tokens) / bucket.rate
+            time.sleep(min(wait, 1.0))
+    
+    def call(self, url, request):
+        """Run request() under the host's rate limit, retrying after throttling"""
+        retries = self.config.get('rate_limit_retries')
+        for attempt in range(retries + 1):
+            sent_at = self.acquire(url)
+            try:
+                result = request()
+            except Exception as e:
+                if not (isinstance(e, ThrottledError) or is_throttle(e)):
+                    raise
+                self.throttled(url, sent_at)
+                if attempt == retries:
+                    raise
+                continue
+            self.succeeded(url)
+            return result
+    
+    def succeeded(self, url):
+        with self.lock:
+            bucket = self._bucket(_host(url))
+            now = time.monotonic()
+            bucket.completed.append(now)
+            _trim(bucket.completed, now)
+            bucket.strikes = 0
+            
+            step = self.config.get('rate_limit_increase')
+            if bucket.ceiling and bucket.rate >= bucket.ceiling * 0.9:
+                step /= 10
+            bucket.rate = min(self.config.get('rate_limit_max_rps'), bucket.rate + step)
+    
+    def throttled(self, url, sent_at=None):
+        """Record a throttling response and start a shared cooldown"""
+        with self.lock:
+            bucket = self._bucket(_host(url))
+            # Requests already in flight when the last throttle hit were sent
+            # at the old rate; counting them again would collapse the rate
+            if sent_at is not None and sent_at <= bucket.last_throttle:
+                return
+            
+            now = time.monotonic()
+            bucket.throttles += 1
+            bucket.strikes += 1
+            bucket.ceiling = bucket.rate
+            bucket.rate = max(self.config.get('rate_limit_min_rps'), bucket.rate / 2)
+            bucket.tokens = 0
+            bucket.last_throttle = now
+            
+            cooldown = min(self.config.get('rate_limit_cooldown') * 2 ** (bucket.strikes - 1),
+                           self.config.get('rate_limit_max_cooldown'))
+            bucket.cooldown_until = now + cooldown
+    
+    def report(self):
+        """Current allowed and effective request rate per host"""
+        now = time.monotonic()
+        with self.lock:
+            hosts = {}
+            for host, bucket in self.hosts.items():
+                _trim(bucket.completed, now)
+                window = min(RATE_WINDOW, max(1.0, now - bucket.completed[0])) if bucket.completed else RATE_WINDOW
+                hosts[host] = {
+                    'rate_limit': round(bucket.rate, 2),
+                    'effective_rate': round(len(bucket.completed) / window, 2),
+                    'ceiling': round(bucket.ceiling, 2) if bucket.ceiling else None,
+                    'cooldown': round(max(0.0, bucket.cooldown_until - now), 1),
+                    'throttles': bucket.throttles
+                }
+        return hosts
+    
+    def effective_rate(self):
+        """Requests per second completed over the last minute, all hosts"""
+        return sum(h['effective_rate'] for h in self.report().values())
+
+def _host(url):
+    host = urlparse(url).hostname or ''
+    # youtube.com, www.youtube.com and m.youtube.com share one limit
+    return '.'.join(host.split('.')[-2:]) or 'unknown'
+
+def _trim(completed, now):
+    while completed and completed[0] < now - RATE_WINDOW:
+        completed.popleft()
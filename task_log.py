@@ -0,0 +1,92 @@
+import sys
+import time
+from collections import deque
+
+LEVELS = {'debug': 10, 'info': 20, 'warning': 30, 'error': 40, 'off': 100}
+
+TASK_LOG_LINES = 200
+APP_LOG_LINES = 1000
+
+# Only records at or above this level are echoed to the console
+_console_level = LEVELS['error']
+
+def configure(config):
+    """Apply the 'log_console_level' setting ('debug' ... 'error', or 'off')"""
+    global _console_level
+    _console_level = LEVELS.get(config.get('log_console_level'), LEVELS['error'])
+
+class TaskLog:
+    """Bounded in-memory log of structured records
+    
+    Records are (time, level, message, fields) tuples in a ring buffer, so
+    logging costs one deque append and old lines fall off by themselves.
+    Formatting only happens when somebody looks at the log.
+    """
+    
+    def __init__(self, name, maxlen=TASK_LOG_LINES):
+        self.name = name
+        self.records = deque(maxlen=maxlen)
+    
+    def log(self, level, message, **fields):
+        self.records.append((time.time(), level, message, fields))
+        if LEVELS[level] >= _console_level:
+            print(f"[{self.name}] {level.upper()}: {message}", file=sys.stderr)
+    
+    def debug(self, message, **fields):
+        self.log('debug', message, **fields)
+    
+    def info(self, message, **fields):
+        self.log('info', message, **fields)
+    
+    def warning(self, message, **fields):
+        self.log('warning', message, **fields)
+    
+    def error(self, message, **fields):
+        self.log('error', message, **fields)
+    
+    def entries(self, min_level='debug'):
+        """Records at or above min_level as dicts, oldest first"""
+        threshold = LEVELS[min_level]
+        return [{'time': t, 'level': level, 'message': message, **fields}
+                for t, level, message, fields in list(self.records)
+                if LEVELS[level] >= threshold]
+    
+    def text(self, min_level='debug'):
+        lines = []
+        for entry in self.entries(min_level):
+            stamp = time.strftime('%H:%M:%S', time.localtime(entry.pop('time')))
+            level = entry.pop('level')
+            message = entry.pop('message')
+            extra = ' '.join(f"{key}={value}" for key, value in entry.items() if value is not None)
+            lines.append(f"{stamp} {level.upper():7} {message}" + (f"  [{extra}]" if extra else ""))
+        return '\n'.join(lines)
+
+# Messages that don't belong to a task (callbacks, indexes, job queue...)
+app_log = TaskLog('app', APP_LOG_LINES)
+
+class YtDlpLogger:
+    """yt-dlp logger writing into a TaskLog
+    
+    Also remembers errors, which ignoreerrors would otherwise swallow.
+    """
+    
+    def __init__(self, log=None):
+        self.log = log or app_log
+        self.errors = []
+    
+    def debug(self, msg):
+        # yt-dlp sends both screen output and verbose output here
+        if msg.startswith('[debug] '):
+            self.log.debug(msg[8:])
+        else:
+            self.log.info(msg)
+    
+    def info(self, msg):
+        self.log.info(msg)
+    
+    def warning(self, msg):
+        self.log.warning(msg[9:] if msg.startswith('WARNING: ') else msg)
+    
+    def error(self, msg):
+        self.errors.append(msg)
+        self.log.error(msg[7:] if msg.startswith('ERROR: ') else msg)
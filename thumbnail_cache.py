@@ -0,0 +1,258 @@
+import hashlib
+import itertools
+import json
+import os
+import queue
+import shutil
+import threading
+import urllib.request
+from collections import OrderedDict
+from pathlib import Path
+from request_scheduler import RequestScheduler
+from task_log import app_log
+
+INDEX_FILE = 'urls.jsonl'
+MAX_BYTES = 5 * 1024 * 1024
+CONTENT_TYPES = {'image/jpeg': 'jpg', 'image/webp': 'webp', 'image/png': 'png', 'image/gif': 'gif'}
+
+# Visible rows are fetched before everything else
+PRIORITY_VISIBLE = 0
+PRIORITY_PREFETCH = 1
+
+def _load_pil():
+    """Pillow is optional; without it there are no previews, but caching still works"""
+    try:
+        from PIL import Image
+        return Image
+    except ImportError:
+        return None
+
+class ThumbnailCache:
+    """Thumbnails shared by GUI previews and thumbnail embedding
+    
+    Images are stored once on disk under the hash of their content, with a
+    small append-only index from URL to hash, so a thumbnail is downloaded
+    once no matter how often (or by whom) it is needed. Decoded preview images
+    are kept in a bounded LRU. Background fetches go through a priority queue
+    so rows the user is looking at are loaded first.
+    """
+    
+    _shared = None
+    _shared_lock = threading.Lock()
+    
+    def __init__(self, config, root=None):
+        self.config = config
+        self.root = Path(root or config.config_dir / 'thumbnails')
+        self.index_file = self.root / INDEX_FILE
+        self.lock = threading.Lock()
+        self.entries = None
+        self.inflight = {}
+        self.images = OrderedDict()
+        self.requests = queue.PriorityQueue()
+        self.waiting = {}
+        self._order = itertools.count()
+        self.workers = []
+    
+    @classmethod
+    def shared(cls, config):
+        """One cache per process"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(config)
+            return cls._shared
+    
+    def _load(self):
+        self.entries = {}
+        if not self.index_file.exists():
+            return
+        with open(self.index_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # torn last line from a crash
+                self.entries[record['url']] = record['file']
+    
+    def path_for(self, url):
+        """Cached file for a URL, or None"""
+        with self.lock:
+            if self.entries is None:
+                self._load()
+            relpath = self.entries.get(url)
+        if relpath is None:
+            return None
+        path = self.root / relpath
+        return str(path) if path.exists() else None
+    
+    def fetch(self, url):
+        """Cached file for a URL, downloading it if needed; None if it can't be fetched"""
+        if not url:
+            return None
+        path = self.path_for(url)
+        if path:
+            return path
+        
+        # Several callers may want the same image at once; fetch it only once
+        with self.lock:
+            event = self.inflight.get(url)
+            owner = event is None
+            if owner:
+                event = self.inflight[url] = threading.Event()
+        if not owner:
+            event.wait()
+            return self.path_for(url)
+        
+        try:
+            return self._download(url)
+        except Exception as e:
+            app_log.error(f"Thumbnail error: {e}")
+            return None
+        finally:
+            with self.lock:
+                self.inflight.pop(url, None)
+            event.set()
+    
+    def _download(self, url):
+        def request():
+            with urllib.request.urlopen(url, timeout=20) as response:
+                return response.read(MAX_BYTES + 1), response.headers.get_content_type()
+        
+        data, content_type = RequestScheduler.shared(self.config).call(url, request)
+        if len(data) > MAX_BYTES:
+            raise Exception(f"Thumbnail too large: {url}")
+        
+        digest = hashlib.sha256(data).hexdigest()
+        ext = CONTENT_TYPES.get(content_type) or os.path.splitext(url.split('?')[0])[1].lstrip('.') or 'jpg'
+        relpath = f"{digest[:2]}/{digest}.{ext}"
+        path = self.root / relpath
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            temp = path.with_name(path.name + '.tmp')
+            with open(temp, 'wb') as f:
+                f.write(data)
+            os.replace(temp, path)
+        
+        with self.lock:
+            if self.entries is None:
+                self._load()
+            self.entries[url] = relpath
+            with open(self.index_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'url': url, 'file': relpath}) + '\n')
+        return str(path)
+    
+    def copy_to(self, url, destination):
+        """Put the cached thumbnail at destination (fetching it first); False if unavailable"""
+        path = self.fetch(url)
+        if not path:
+            return False
+        # A copy, not a link: postprocessors convert and delete their thumbnail
+        shutil.copyfile(path, destination)
+        return True
+    
+    # ===== PREVIEWS =====
+    
+    @staticmethod
+    def previews_available():
+        return _load_pil() is not None
+    
+    def request(self, url, callback, priority=PRIORITY_PREFETCH):
+        """Load a preview in the background; callback(url, image) runs on a cache thread
+        
+        Asking again for a URL that is still queued only raises its priority.
+        """
+        if not url:
+            return
+        with self.lock:
+            pending = self.waiting.get(url)
+            if pending:
+                pending['callbacks'].append(callback)
+                if priority >= pending['priority']:
+                    return
+                pending['priority'] = priority
+            else:
+                self.waiting[url] = {'priority': priority, 'callbacks': [callback]}
+            self._start_workers()
+        self.requests.put((priority, next(self._order), url))
+    
+    def _start_workers(self):
+        for i in range(self.config.get('thumbnail_workers') - len(self.workers)):
+            worker = threading.Thread(target=self._worker, name='thumbnail', daemon=True)
+            self.workers.append(worker)
+            worker.start()
+    
+    def _worker(self):
+        while True:
+            priority, order, url = self.requests.get()
+            with self.lock:
+                pending = self.waiting.get(url)
+                # Stale entry left behind when the URL's priority was raised
+                if pending is None or pending['priority'] != priority:
+                    continue
+            
+            image = self.image(url)
+            with self.lock:
+                callbacks = self.waiting.pop(url, {}).get('callbacks', [])
+            for callback in callbacks:
+                try:
+                    callback(url, image)
+                except Exception as e:
+                    app_log.error(f"Thumbnail callback error: {e}")
+    
+    def image(self, url):
+        """Decoded preview image (a PIL image) for a URL, or None"""
+        size = tuple(self.config.get('thumbnail_preview_size'))
+        key = (url, size)
+        with self.lock:
+            if key in self.images:
+                self.images.move_to_end(key)
+                return self.images[key]
+        
+        Image = _load_pil()
+        path = self.fetch(url) if Image else None
+        if not path:
+            return None
+        try:
+            with Image.open(path) as img:
+                img = img.convert('RGB')
+                img.thumbnail(size)
+        except (OSError, ValueError) as e:
+            app_log.error(f"Thumbnail decode error: {e}")
+            return None
+        
+        with self.lock:
+            self.images[key] = img
+            while len(self.images) > self.config.get('thumbnail_memory_items'):
+                self.images.popitem(last=False)
+        return img
+
+class ThumbnailPlacer:
+    """yt-dlp pre-processor that puts the cached thumbnail where yt-dlp expects it
+    
+    Runs in the 'video' stage, before yt-dlp writes thumbnails. With the file
+    already present (and overwrites off) yt-dlp skips its own download and
+    the embed postprocessor uses the cached copy.
+    """
+    
+    def __init__(self, cache):
+        self.cache = cache
+        self.ydl = None
+    
+    def set_downloader(self, ydl):
+        self.ydl = ydl
+    
+    def run(self, info):
+        from yt_dlp.utils import determine_ext, replace_extension
+        
+        thumbnails = info.get('thumbnails') or []
+        if thumbnails and thumbnails[-1].get('url'):
+            # yt-dlp writes the last (preferred) thumbnail next to the temp filename
+            thumbnail = thumbnails[-1]
+            ext = thumbnail.get('ext') or determine_ext(thumbnail['url'], 'jpg')
+            filename = replace_extension(self.ydl.prepare_filename(info, 'temp'), ext, info.get('ext'))
+            if not os.path.exists(filename):
+                try:
+                    Path(filename).parent.mkdir(parents=True, exist_ok=True)
+                    self.cache.copy_to(thumbnail['url'], filename)
+                except OSError as e:
+                    app_log.error(f"Thumbnail cache error: {e}")
+        return [], info
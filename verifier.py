@@ -0,0 +1,80 @@
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+
+class FileVerifier:
+    """Sanity checks for a finished download
+    
+    yt-dlp runs with ignoreerrors, so a download can "succeed" with a
+    truncated or empty file. These checks catch that before a task is
+    marked completed.
+    """
+    
+    def __init__(self, config):
+        self.config = config
+        self.ffprobe = shutil.which('ffprobe')
+    
+    def verify(self, filepath, expected_size=None, expected_duration=None):
+        """Return (error, sha256); error is None when the file looks good"""
+        if not filepath or not os.path.isfile(filepath):
+            return "Output file is missing", None
+        
+        size = os.path.getsize(filepath)
+        if size == 0:
+            return "Output file is empty", None
+        
+        # Merging and embedding change the size a little, so only a file
+        # clearly smaller than announced counts as truncated
+        tolerance = self.config.get('verify_size_tolerance')
+        if expected_size and size < expected_size * (1 - tolerance):
+            return f"File is truncated ({size} of ~{expected_size} bytes)", None
+        
+        if self.ffprobe:
+            error = self._probe(filepath, expected_duration)
+            if error:
+                return error, None
+        
+        sha256 = self._hash(filepath) if self.config.get('verify_hash') else None
+        return None, sha256
+    
+    def _probe(self, filepath, expected_duration):
+        try:
+            result = subprocess.run(
+                [self.ffprobe, '-v', 'error', '-show_entries', 'format=duration:stream=codec_type',
+                 '-of', 'json', filepath],
+                capture_output=True, text=True, timeout=60)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            return f"ffprobe failed: {e}"
+        
+        if result.returncode != 0:
+            return f"Container is unreadable: {result.stderr.strip()[:200]}"
+        
+        try:
+            data = json.loads(result.stdout)
+        except ValueError:
+            return "ffprobe returned unreadable output"
+        
+        if not data.get('streams'):
+            return "File has no audio or video streams"
+        
+        try:
+            duration = float(data.get('format', {}).get('duration'))
+        except (TypeError, ValueError):
+            return "File has no readable duration"
+        
+        if expected_duration:
+            slack = max(2.0, expected_duration * 0.05)
+            if duration < expected_duration - slack:
+                return f"Duration is {duration:.1f}s, expected {expected_duration:.1f}s"
+        
+        return None
+    
+    @staticmethod
+    def _hash(filepath):
+        digest = hashlib.sha256()
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
@@ -0,0 +1,276 @@
+import heapq
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from downloader import VideoDownloader
+from task_log import app_log
+
+class ChannelWatcher:
+    """Periodically poll subscribed channels and queue shorts not seen before"""
+    
+    def __init__(self, config, download_manager, output_path=None):
+        self.config = config
+        self.download_manager = download_manager
+        self.output_path = output_path or config.get('download_path')
+        self.running = False
+        self.wakeup = threading.Event()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.pool = None
+        self.schedule = []
+        self.next_due = {}
+        self.in_flight = set()
+        self.failures = {}
+        self.recent_results = deque(maxlen=20)
+        self.backoff = 1.0
+        self.last_poll_started = 0.0
+        self.config_mtime = self._config_mtime()
+        self.state = config.load_watch_state()
+        self.callbacks = {
+            'poll_complete': None,
+            'poll_failed': None
+        }
+    
+    def set_callback(self, event, callback):
+        self.callbacks[event] = callback
+    
+    def start(self):
+        """Start the scheduler thread"""
+        if self.running:
+            return
+        
+        self.running = True
+        self.pool = ThreadPoolExecutor(max_workers=self.config.get('watch_workers') or 2,
+                                       thread_name_prefix='watch')
+        self._build_schedule()
+        self.thread = threading.Thread(target=self._run, name='watch', daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        """Stop polling and persist seen IDs"""
+        self.running = False
+        self.wakeup.set()
+        
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=5)
+        if self.pool:
+            self.pool.shutdown(wait=False)
+            self.pool = None
+        
+        self._save_state()
+    
+    def reload(self):
+        """Pick up subscriptions added to or removed from config.json (e.g. by --subscribe)
+        
+        New channels are polled right away; existing ones keep their due
+        times. Heap entries of removed ones are skipped as stale.
+        """
+        subscriptions = self.config.reload_subscriptions()
+        urls = {sub['url'] for sub in subscriptions}
+        with self.lock:
+            for url in [url for url in self.next_due if url not in urls]:
+                del self.next_due[url]
+            now = time.monotonic()
+            for sub in subscriptions:
+                if sub['url'] not in self.next_due and sub['url'] not in self.in_flight:
+                    self._push(sub['url'], now)
+        self.wakeup.set()
+    
+    def _config_mtime(self):
+        try:
+            return self.config.config_file.stat().st_mtime
+        except OSError:
+            return None
+    
+    def _check_config(self):
+        mtime = self._config_mtime()
+        if mtime != self.config_mtime:
+            self.config_mtime = mtime
+            self.reload()
+    
+    def _build_schedule(self):
+        # Spread first polls evenly over the shortest interval so a large
+        # subscription list doesn't hit YouTube all at once on startup
+        subscriptions = [sub for sub in self.config.get('subscriptions') or []
+                         if sub['url'] not in self.in_flight]
+        self.schedule = []
+        self.next_due = {}
+        if not subscriptions:
+            return
+        
+        spread = min(self._interval(sub) for sub in subscriptions)
+        step = spread / len(subscriptions)
+        now = time.monotonic()
+        for i, sub in enumerate(subscriptions):
+            self._push(sub['url'], now + i * step + random.uniform(0, step))
+    
+    def _push(self, url, due):
+        self.next_due[url] = due
+        heapq.heappush(self.schedule, (due, url))
+    
+    def _interval(self, sub):
+        return sub.get('interval') or self.config.get('watch_interval')
+    
+    def _run(self):
+        """Scheduler loop: sleep until the next poll is due, never busy-wait"""
+        min_spacing = self.config.get('watch_min_spacing')
+        
+        while self.running:
+            with self.lock:
+                next_due = self.schedule[0][0] if self.schedule else None
+            
+            now = time.monotonic()
+            if next_due is None:
+                timeout = None
+            else:
+                # Keep a minimum gap between polls so overlapping due times don't burst
+                start_at = max(next_due, self.last_poll_started + min_spacing * self.backoff)
+                timeout = max(0.0, start_at - now)
+            
+            if timeout is None or timeout > 0:
+                # Wake up now and then to notice subscription changes on disk
+                check = self.config.get('watch_reload_interval')
+                self.wakeup.wait(check if timeout is None else min(timeout, check))
+                self.wakeup.clear()
+                self._check_config()
+                continue
+            
+            with self.lock:
+                due, url = heapq.heappop(self.schedule)
+                # Entries left over from a reload are stale; skip them
+                if self.next_due.get(url) != due:
+                    continue
+                del self.next_due[url]
+                sub = self._find_subscription(url)
+                if sub is None:
+                    continue
+                self.in_flight.add(url)
+            
+            self.last_poll_started = time.monotonic()
+            self.pool.submit(self._poll, sub)
+    
+    def _find_subscription(self, url):
+        for sub in self.config.get('subscriptions') or []:
+            if sub['url'] == url:
+                return sub
+        return None
+    
+    def _poll(self, sub):
+        """Poll one channel and queue its unseen shorts"""
+        url = sub['url']
+        try:
+            new_videos, seen_ids = self._fetch_new(sub)
+            if new_videos:
+                self.download_manager.add_videos(new_videos, self.output_path)
+                self.download_manager.prune_finished(self.config.get('watch_task_history'))
+            # Only now: anything that failed before this point is retried next poll
+            self._mark_seen(url, seen_ids)
+            self._record_result(url, None)
+            self._notify_callback('poll_complete', url, new_videos)
+        except Exception as e:
+            self._record_result(url, e)
+            self._notify_callback('poll_failed', url, str(e))
+        finally:
+            with self.lock:
+                self.in_flight.discard(url)
+                if self.running and self._find_subscription(url):
+                    self._push(url, self._next_due(sub))
+            self._save_state()
+            self.wakeup.set()
+    
+    def _fetch_new(self, sub):
+        """Unseen shorts to queue, and the IDs to mark seen once they are queued"""
+        url = sub['url']
+        downloader = VideoDownloader(self.config)
+        entries = downloader.list_entries(url)
+        
+        with self.lock:
+            first_poll = url not in self.state
+            seen_set = set(self.state.get(url, ()))
+        known = self.download_manager.known_video_ids()
+        
+        unseen = [e for e in entries if e['id'] not in seen_set]
+        
+        # Without backfill the first poll only records what already exists
+        if first_poll and not sub.get('backfill', self.config.get('watch_backfill')):
+            return [], [e['id'] for e in unseen]
+        
+        videos = []
+        resolved = set()
+        for entry in unseen:
+            if entry['id'] in known:
+                resolved.add(entry['id'])
+                continue
+            # A failed (e.g. throttled) lookup stays unseen and is retried next poll
+            video_info = downloader.resolve_entry(entry)
+            if video_info:
+                videos.append(video_info)
+                resolved.add(entry['id'])
+        # Keep the channel's newest-first order for _mark_seen
+        return videos, [e['id'] for e in unseen if e['id'] in resolved]
+    
+    def _mark_seen(self, url, video_ids):
+        # Channels list newest first; only the most recent IDs need to be
+        # remembered to recognise what is new, which keeps memory bounded
+        limit = self.config.get('watch_seen_limit')
+        with self.lock:
+            seen = self.state.setdefault(url, [])
+            seen[:0] = video_ids
+            del seen[limit:]
+    
+    def _record_result(self, url, error):
+        with self.lock:
+            self.recent_results.append(error is None)
+            if error is None:
+                self.failures.pop(url, None)
+            else:
+                self.failures[url] = self.failures.get(url, 0) + 1
+            
+            # Throttle everything while the recent error rate is high, and
+            # recover gradually once polls start succeeding again
+            error_rate = self.recent_results.count(False) / len(self.recent_results)
+            if error_rate > 0.5 and len(self.recent_results) >= 4:
+                self.backoff = min(self.backoff * 2, 16.0)
+            elif error_rate < 0.2:
+                self.backoff = max(self.backoff / 2, 1.0)
+    
+    def _next_due(self, sub):
+        interval = self._interval(sub)
+        jitter = self.config.get('watch_jitter')
+        failures = self.failures.get(sub['url'], 0)
+        delay = interval * random.uniform(1 - jitter, 1 + jitter) * self.backoff
+        return time.monotonic() + delay * (2 ** min(failures, 5))
+    
+    def _save_state(self):
+        # Forget channels that were unsubscribed
+        urls = {sub['url'] for sub in self.config.get('subscriptions') or []}
+        with self.lock:
+            for url in list(self.state):
+                if url not in urls:
+                    del self.state[url]
+            state = {url: list(ids) for url, ids in self.state.items()}
+        self.config.save_watch_state(state)
+    
+    def get_status(self):
+        """Snapshot of the watcher for display"""
+        with self.lock:
+            now = time.monotonic()
+            next_polls = {url: max(0, int(due - now)) for url, due in self.next_due.items()}
+            return {
+                'subscriptions': len(self.config.get('subscriptions') or []),
+                'polling': sorted(self.in_flight),
+                'next_polls': next_polls,
+                'failing': dict(self.failures),
+                'backoff': self.backoff
+            }
+    
+    def _notify_callback(self, event, *args):
+        """Notify registered callback"""
+        callback = self.callbacks.get(event)
+        if callback:
+            try:
+                callback(*args)
+            except Exception as e:
+                app_log.error(f"Callback error: {e}")